@@ -21,6 +21,13 @@ from src.commands.subscribe import Subscribe
 from src.commands.maintenance import Maintenance
 from src.services.sonarr import Sonarr
 from src.services.radarr import Radarr
+from src.services.datastore import get_data_store
+from src.services.stats import get_stats_log
+from src.services.persistence import SqlitePersistence
+from src.services.arr import open_arr_sessions, close_arr_sessions
+from src.services.webhook import WebhookServer
+from src.services.limiter import BACKGROUND
+from src.services.transmission import CHECK_INTERVAL
 
 from telegram.error import NetworkError, TimedOut, RetryAfter, Conflict
 from telegram import Update, BotCommand
@@ -31,8 +38,7 @@ from telegram.ext import (
     CallbackQueryHandler,
     MessageHandler,
     Application,
-    ConversationHandler,
-    PicklePersistence
+    ConversationHandler
 )
 
 
@@ -52,6 +58,8 @@ class Bot:
         # not be able to accept inbound connections, so it pushes a TCP
         # heartbeat to the fallback host instead of the other way around.
         self._heartbeat_task: Optional[asyncio.Task] = None
+        # Radarr/Sonarr import webhook receiver (normal mode only)
+        self.webhook: Optional[WebhookServer] = None
         # Display names for the two hosts, used in group-chat notifications.
         # Defaults are intentionally generic so the project is reusable; set
         # PRIMARY_NAME / FALLBACK_NAME in dot-env to your own hostnames.
@@ -64,6 +72,8 @@ class Bot:
         self.start = Start(args, logger, self.function, self.maintenance)
         self.account = Account(logger, self.function)
         self.message = Message(args, logger, self.function)
+        self.data_store = get_data_store(args, logger)
+        self.stats = get_stats_log(args, logger)
         self.allowed_users = list(map(int, os.getenv('CHAT_ID_ADMIN').split(",")))
 
         # Plex/Sonarr/Radarr/Transmission-dependent components are only used in
@@ -73,16 +83,16 @@ class Bot:
             self.movie = Movie(args, logger, self.function)
             self.schedule = Schedule(args, logger, self.function)
             self.subscribe = Subscribe(args, logger, self.function)
-            self.sonarr = Sonarr(logger)
-            self.radarr = Radarr(logger)
+            self.sonarr = Sonarr(logger, BACKGROUND)
+            self.radarr = Radarr(logger, BACKGROUND)
             self.start.subscribe = self.subscribe
 
         # Set vars based on live/dev
         if args.env == "live":
-            persistence = PicklePersistence(filepath="/root/scripts/plex-download-bot/bot_state.pkl")
+            persistence = SqlitePersistence(filepath="/root/scripts/plex-download-bot/bot_state.db", pickle_filepath="/root/scripts/plex-download-bot/bot_state.pkl")
             token = os.getenv('BOT_TOKEN')
         else:
-            persistence = PicklePersistence(filepath="bot_state.pkl")
+            persistence = SqlitePersistence(filepath="bot_state.db", pickle_filepath="bot_state.pkl")
             token = os.getenv('BOT_TOKEN_DEV')
 
         # Create the Application using the new async API. post_init starts
@@ -102,6 +112,7 @@ class Bot:
 
         # Register the appropriate conversation handler for the current mode
         if self.mode == "normal":
+            self.webhook = WebhookServer(logger, self.schedule, self.application)
             self.application.add_handler(self._build_normal_conversation())
         else:
             self.application.add_handler(self._build_maintenance_conversation())
@@ -119,16 +130,44 @@ class Bot:
         self.application.job_queue.run_once(lambda _: self.application.create_task(self.publish_command_list()), when=0)
         self.application.job_queue.run_once(lambda ctx: self.application.create_task(self.notify_admin_startup(ctx)), when=0)
 
+        # Keep the stats log bounded, stats are written in both modes
+        self.application.job_queue.run_repeating(self.stats.compact, interval=86400, first=300)
+
         # Recurring jobs need Plex/Sonarr/Radarr/Transmission — only in normal mode
         if self.mode == "normal":
-            self.application.job_queue.run_repeating(self.schedule.check_notify_list, interval=1800, first=0)
+            self.application.job_queue.run_repeating(self.radarr.refresh_library, interval=self.radarr.library_refresh_interval(), first=0)
+            self.application.job_queue.run_repeating(self.sonarr.refresh_library, interval=self.sonarr.library_refresh_interval(), first=0)
+            self.application.job_queue.run_repeating(self.movie.disk_space.refresh, interval=self.movie.disk_space.refresh_interval, first=0)
+            self.application.job_queue.run_repeating(self.serie.disk_space.refresh, interval=self.serie.disk_space.refresh_interval, first=0)
+            self.application.job_queue.run_repeating(self.schedule.check_transmission, interval=CHECK_INTERVAL, first=10)
+            self.application.job_queue.run_repeating(self.schedule.check_notify_list, interval=self.notify_check_interval(), first=10)
+            if self.schedule.history_interval():
+                self.application.job_queue.run_repeating(self.schedule.check_history, interval=self.schedule.history_interval(), first=60)
             self.application.job_queue.run_repeating(self.sonarr.scan_missing_media, interval=21600, first=0)
             self.application.job_queue.run_repeating(self.radarr.scan_missing_media, interval=21600, first=0)
+            self.application.job_queue.run_repeating(self.sonarr.poll_commands, interval=300, first=300)
+            self.application.job_queue.run_repeating(self.radarr.poll_commands, interval=300, first=300)
 
         # Start the bot
         self.application.run_polling(
             allowed_updates=Update.ALL_TYPES, poll_interval=1, timeout=5)
 
+    def notify_check_interval(self) -> int:
+        """Seconds between full notify list checks.
+
+        Without the webhook and the history check this is the only way
+        notifications go out, so it runs every 30 minutes. Otherwise
+        imports are handled as they happen (webhook) or within minutes
+        (history check) and the full check is only a safety net for missed
+        events, every NOTIFY_CHECK_INTERVAL seconds (default 6 hours).
+        """
+        if WebhookServer.configured_port() is None and not Schedule.history_interval():
+            return 1800
+        try:
+            return max(300, int(os.getenv("NOTIFY_CHECK_INTERVAL", "21600")))
+        except ValueError:
+            return 21600
+
     def _welcome_button_handlers(self) -> list:
         """CallbackQueryHandlers for the buttons on the /start welcome message.
 
@@ -308,8 +347,12 @@ class Bot:
         On the primary (normal mode) this starts the outbound heartbeat
         pusher so the fallback's watcher can tell the bot process is alive.
         The fallback (maintenance mode) does not push.
+        It also opens the pooled Radarr/Sonarr sessions shared by every
+        Radarr/Sonarr instance and starts the import webhook receiver.
         """
         if self.mode == "normal":
+            await open_arr_sessions()
+            await self.webhook.start()
             self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
 
     async def _post_stop(self, application: Application) -> None:
@@ -330,6 +373,18 @@ class Bot:
                 pass
             self._heartbeat_task = None
 
+        # Stop taking webhook calls and close the pooled Radarr/Sonarr connections
+        if self.webhook is not None:
+            await self.webhook.stop()
+        await close_arr_sessions()
+
+        # Write out pending data store changes before handing over, so the
+        # fallback starts from the latest state
+        try:
+            await self.data_store.flush()
+        except Exception as e:
+            await self.log.logger(f"Failed to flush the data store on shutdown: {e}", False, "warning", False)
+
         # Fast path first: get the fallback going before we spend time on
         # the Telegram round-trip.
         if self.mode == "normal":
@@ -1,11 +1,8 @@
 #!/usr/bin/python3
 
 import asyncio
-import os
-import json
 import traceback
 import time
-from datetime import datetime
 from typing import Optional
 from abc import ABC, abstractmethod
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
@@ -14,6 +11,10 @@ from telegram.ext import CallbackContext, ConversationHandler
 from src.states import REQUEST_AGAIN, REQUEST_MOVIE, REQUEST_SERIE, AANMELDEN_SERIE
 from src.services.plex import Plex
 from src.services.transmission import TransmissionService, check_transmission_and_trigger_scans
+from src.services.datastore import get_data_store
+from src.services.stats import get_stats_log
+from src.services.diskspace import get_disk_space_service
+from src.services.arrqueue import get_queue_status
 from src.commands.start import Start
 
 
@@ -32,10 +33,12 @@ class Media(ABC):
         self.option_state = option_state
         self.plex = Plex(self.log)
         self.start = Start(self.args, self.log, self.function)
+        self.disk_space = get_disk_space_service(media_handler, media_folder)
+        self.queue = get_queue_status(media_handler)
 
-        # Set data.json/stats.json file based on live/dev arg
-        self.data_json = "data.json" if args.env == "live" else "data.dev.json"
-        self.stats_json = "stats.json" if args.env == "live" else "stats.dev.json"
+        # Set data store and stats log based on live/dev arg
+        self.data_store = get_data_store(args, logger)
+        self.stats = get_stats_log(args, logger)
 
     @abstractmethod
     async def get_media_states(self) -> dict:
@@ -73,6 +76,11 @@ class Media(ABC):
         await self.function.send_message(f"Oke, je wilt dus graag {sanitize_message} op Plęx zien. Even kijken of dat mogelijk is...", update, context)
         await asyncio.sleep(1)
 
+        # Don't let the user wait on a backend that is known to be down
+        if not self.media_handler.is_available():
+            await self.function.send_message(f"*😵 Het zoeken naar {context.user_data['label']}s lukt op dit moment niet*\n\nDe serverbeheerder is hiervan op de hoogte. Probeer het over een paar minuten nog eens.", update, context)
+            return ConversationHandler.END
+
         # Make the API request
         context.user_data["media_object"] = await self.media_handler.lookup_by_name(sanitize_message)
 
@@ -179,16 +187,17 @@ class Media(ABC):
         await update.callback_query.answer()
         context.user_data['media_data'] = context.user_data["media_object"][int(update.callback_query.data)]
 
-        # Check Transmission and fetch active torrents
+        # Check Transmission and fetch the Radarr/Sonarr download queue
         transmission = TransmissionService(self.log)
-        transmission_up, active_torrents = await transmission.get_active_torrents()
+        transmission_up = await transmission.is_available()
+        queue = await self.queue.snapshot()
 
         # Get the media states
         states = await self.get_media_states()
 
         # Loop through states
         for state, details in states.items():
-            if details["condition"](context.user_data['media_data'], active_torrents):
+            if details["condition"](context.user_data['media_data'], queue):
 
                 # Sanitize title and set a var
                 context.user_data['media_data']['title'] = self.function.sanitize_text(context.user_data['media_data']['title'])
@@ -226,9 +235,9 @@ class Media(ABC):
                         # user was informerd in previous steps about the error
                         return ConversationHandler.END
 
-                # Do extra action if defined
+                # Do extra action if defined, for the media that was just added
                 if "extra_action" in details:
-                    await getattr(self.media_handler, details["extra_action"])()
+                    await getattr(self.media_handler, details["extra_action"])([context.user_data['media_data'].get("id")])
 
                 # Inform owner about unmonitored series if defined
                 if "inform_unmonitored" in details:
@@ -237,7 +246,7 @@ class Media(ABC):
                 # Send the message if defined
                 if "message" in details:
                     # Adjust wording so we don't promise an immediate download start if transmission is down.
-                    msg = details["message"].format(title=context.user_data['media_data']['title'])
+                    msg = details["message"].format(title=context.user_data['media_data']['title'], progress=self.queue.describe(context.user_data['media_data'].get("id")))
                     if (not transmission_up) and ("action" in details and details["action"] == "start_download"):
                         msg = (
                             f"Er is op dit moment helaas te weinig ruimte op de server om de downløad te starten. "
@@ -342,26 +351,8 @@ class Media(ABC):
             await self.function.send_message(f"Oke, bedankt voor het gebruiken van deze bot. Wil je nog iets anders downløaden? Stuur dan /start", update, context)
             return ConversationHandler.END
 
-        # Add media_id + user_id to JSON
-        with open(self.data_json, "r+") as file:
-            json_data = json.load(file)
-
-            # Check if user already has entry in the notify list, otherwise create it
-            if str(update.effective_user.id) not in json_data["notify_list"]:
-                json_data["notify_list"][f"{update.effective_user.id}"] = {}
-
-            # Check if serie/film block exists, otherwise create it
-            for media_type in ["serie", "film", "recurring_serie"]:
-                if media_type not in json_data["notify_list"][f"{update.effective_user.id}"]:
-                    json_data["notify_list"][f"{update.effective_user.id}"][f"{media_type}"] = {}
-
-            # Add media to notify_list
-            json_data["notify_list"][f"{update.effective_user.id}"][f"{context.user_data['label']}"][context.user_data['media_data']["tmdbId"]] = round(time.time())
-
-            # Write to the file
-            file.seek(0)
-            json.dump(json_data, file, indent=4)
-            file.truncate()
+        # Add media to the notify list
+        await self.data_store.add_notify(update.effective_user.id, context.user_data['label'], context.user_data['media_data']["tmdbId"], round(time.time()))
 
         # Send final message
         if context.user_data['label'] == "serie" and not context.user_data['media_data'].get("ended", False):
@@ -406,65 +397,37 @@ class Media(ABC):
         # Queue download
         response = await self.media_handler.queue_download(payload)
 
+        # The download claims space, update the disk-space view in the background
+        context.application.create_task(self.disk_space.refresh())
+
         # Check if download queue was succesfull
         if not response:
             await self.function.send_message(f"Er ging iets mis bij het starten van de downløad. De serverbeheerder is hiervan op de hoogte en zal dit zo snel mogelijk oplossen. Probeer het op een later moment nog is.", update, context)
             return False
 
+        # Keep the Radarr/Sonarr id of the added media, the extra action searches for it
+        if isinstance(response, dict) and response.get("id"):
+            context.user_data['media_data']['id'] = response["id"]
+
         return True
 
     async def check_disk_space(self, context: CallbackContext) -> Optional[str]:
         """Checks if any configured media folder has >= 150GB free on its mount."""
 
-        # Get list of disks and diskspace
-        disk_list = [p.strip() for p in context.user_data["media_folder"].split(",") if p.strip()]
-        disk_space = await self.media_handler.get_disk_space()
+        # Served from the cached disk-space view, refreshed in the background
+        folder = await self.disk_space.pick_folder()
 
         # Check retrieve diskspace succesfull
-        if not disk_space:
+        if folder is None and not self.disk_space.fresh:
             await self.log.logger("No disk space data returned", False, "error", True)
-            return None
-
-        # 150GB to bytes
-        GB_150 = 150 * 1024 ** 3
-
-        # Pre-normalize mount paths
-        mounts = []
-        for d in disk_space:
-            mount = os.path.normpath(d["path"])
-            mounts.append({**d, "path": mount})
-
-        def is_under(folder: str, mount: str) -> bool:
-            folder = os.path.normpath(folder)
-            mount = os.path.normpath(mount)
-            return folder == mount or folder.startswith(mount + os.sep)
-
-        for folder in disk_list:
-            folder_norm = os.path.normpath(folder)
-
-            # find best (most specific) mount for this folder
-            candidates = [d for d in mounts if is_under(folder_norm, d["path"])]
-            if not candidates:
-                continue
-
-            best = max(candidates, key=lambda d: len(d["path"]))
-
-            if best.get("freeSpace", 0) > GB_150:
-                # return the folder you want to use (the configured one)
-                return folder_norm
 
-        return None
+        return folder
 
     async def write_to_stats(self, update: Update, context: CallbackContext) -> None:
-        """ Writes stats to the stats.json file """
+        """ Appends the media request to the stats log """
 
         # Add media download requests to the stats
         try:
-            with open(self.stats_json, "r+") as file:
-                data = json.load(file)
-                data[f"{update.effective_user.id}"][f"{context.user_data['label']}_requests"][datetime.now().strftime("%d-%m-%Y %H:%M:%S")] = context.user_data['media_data']['title']
-                file.seek(0)
-                json.dump(data, file, indent=4)
-                file.truncate()
+            await self.stats.log_request(update.effective_user.id, context.user_data['label'], context.user_data['media_data']['title'])
         except Exception as e:
-            await self.log.logger(f"Error during write to stats.json for media {context.user_data['media_data']['title']} and user {context.user_data['gebruiker']}, username {update.effective_user.first_name}.\n\nError: {' '.join(e.args)}\nTraceback:\n{traceback.format_exc()}", False, "error", True)
+            await self.log.logger(f"Error during write to the stats log for media {context.user_data['media_data']['title']} and user {context.user_data['gebruiker']}, username {update.effective_user.first_name}.\n\nError: {' '.join(e.args)}\nTraceback:\n{traceback.format_exc()}", False, "error", True)
@@ -2,13 +2,12 @@
 
 import asyncio
 import os
-import json
-import aiofiles
 import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext, ConversationHandler
 from telegram.error import BadRequest, TelegramError
 from src.states import MESSAGE_ID, MESSAGE_MESSAGE, MESSAGE_ALL_ID, ADD_MOVIE, ADD_MOVIE_USER
+from src.services.datastore import get_data_store
 
 
 class Message:
@@ -19,17 +18,7 @@ class Message:
         self.args = args
         self.log = logger
         self.function = functions
-        self.data_json = "data.json" if args.env == "live" else "data.dev.json"
-
-    async def _load_data(self) -> dict:
-        async with aiofiles.open(self.data_json, "r") as file:
-            data = json.loads(await file.read())
-
-        return data
-
-    async def _save_data(self, data: dict) -> None:
-        async with aiofiles.open(self.data_json, "w") as file:
-            await file.write(json.dumps(data, indent=4))
+        self.data_store = get_data_store(args, logger)
 
     async def _send_admin_broadcast(self, text: str, chat_id: int, context: CallbackContext) -> None:
         """Underscore pairs → italic (HTML); rest escaped. Falls back to plain text if Telegram rejects HTML."""
@@ -40,24 +29,11 @@ class Message:
             await self.log.logger(f"Admin broadcast HTML failed; sending plain text. Error: {e}", False, "warning", False)
             await self.function.send_message(text, chat_id, context, None, None, False)
 
-    @staticmethod
-    def _is_broadcast_subscribed(data: dict, user_id: str) -> bool:
-        # Default: subscribed unless explicitly turned off
-        subs = data.get("update_messages", {})
-        if not isinstance(subs, dict):
-            return True
-        return subs.get(user_id, True) is True
-
     async def updates_subscribe(self, update: Update, context: CallbackContext) -> int:
         if update.callback_query:
             await update.callback_query.answer()
 
-        data = await self._load_data()
-        subs = data.setdefault("update_messages", {})
-        user_id = str(update.effective_user.id)
-        was_subscribed = subs.get(user_id, True) is True
-        subs[user_id] = True
-        await self._save_data(data)
+        was_subscribed = await self.data_store.set_update_subscription(update.effective_user.id, True)
 
         await self.function.send_message(
             "Je stond al aangemeld voor algemene updates van de serverbeheerder."
@@ -72,12 +48,7 @@ class Message:
         if update.callback_query:
             await update.callback_query.answer()
 
-        data = await self._load_data()
-        subs = data.setdefault("update_messages", {})
-        user_id = str(update.effective_user.id)
-        was_subscribed = subs.get(user_id, True) is True
-        subs[user_id] = False
-        await self._save_data(data)
+        was_subscribed = await self.data_store.set_update_subscription(update.effective_user.id, False)
 
         await self.function.send_message(
             "Je bent nu afgemeld voor algemene updates van de serverbeheerder."
@@ -166,15 +137,12 @@ class Message:
             await self.function.send_message(f"Bericht is verstuurd.", update, context)
             return ConversationHandler.END
 
-        # Load JSON file
-        json_data = await self._load_data()
-
         # Send the message for all users
         subscribed_count = 0
         skipped_count = 0
 
-        for key in json_data.get("user_id", {}):
-            if not self._is_broadcast_subscribed(json_data, str(key)):
+        for key in await self.data_store.user_ids():
+            if not await self.data_store.is_update_subscribed(key):
                 skipped_count += 1
                 continue
             try:
@@ -242,19 +210,8 @@ class Message:
             await self.function.send_message("Foutieve input, geef alleen cijfers op", update, context)
             return ADD_MOVIE_USER
 
-        # Add info to JSON
-        self.data_json = "data.json" if self.args.env == "live" else "data.dev.json"
-
-        # Load JSON file
-        async with aiofiles.open(self.data_json, "r") as file:
-            json_data = json.loads(await file.read())
-
         # Add / overwrite movie entry
-        json_data["notify_list"][str(context.user_data["user_to_add_movie"])]["film"][tmdb_to_add_movie] = int(time.time())
-
-        # Write back to JSON
-        async with aiofiles.open(self.data_json, "w") as file:
-            await file.write(json.dumps(json_data, indent=4))
+        await self.data_store.add_notify(context.user_data["user_to_add_movie"], "film", tmdb_to_add_movie, int(time.time()))
 
         # Send the message
         await self.function.send_message(f"Film ID {tmdb_to_add_movie} is toegevoegd voor user {context.user_data['user_to_add_movie']}", update, context)
@@ -1,7 +1,6 @@
 #!/usr/bin/python3
 
 import os
-import re
 from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext, ConversationHandler
@@ -23,18 +22,9 @@ class Movie(Media):
 
         return {
             "downloading": {
-                # "condition": lambda movie, torrents: any(movie["title"].lower() in t.name.lower() for t in torrents),
-                "condition": lambda movie, torrents: any(
-                    re.search(
-                        r"\b" + r"[.\s_-]+".join(
-                            map(re.escape, movie["title"].split())
-                        ) + r"\b",
-                        t.name,
-                        re.IGNORECASE
-                    )
-                    for t in torrents
-                ),
-                "message": "{title} wordt op dit moment al gedownløad, nog even geduld 😄",
+                # Exact match on the Radarr/Sonarr id in the download queue
+                "condition": lambda movie, queue: movie.get("id") in queue,
+                "message": "{title} wordt op dit moment al gedownløad{progress}, nog even geduld 😄",
                 "state_message": True,
                 "next_state": MOVIE_NOTIFY
             },
@@ -55,7 +45,7 @@ class Movie(Media):
                 "condition": lambda movie, _: movie.get("movieFileId") == 0 and not movie.get("monitored") and movie.get("status") == "released",
                 "message": "De downløad voor {title} is nu gestart, gemiddeld duurt het 1 uur voordat een film online staat, nog even geduld 😄",
                 "action": "start_download",
-                "extra_action": "scan_missing_media",
+                "extra_action": "search_media",
                 "state_message": True,
                 "next_state": MOVIE_NOTIFY
             },
@@ -1,9 +1,9 @@
 #!/usr/bin/python3
 
-import json
+import asyncio
+import os
 import re
 import time
-import aiofiles
 from pathlib import Path
 from datetime import datetime, timezone
 from telegram.ext import CallbackContext
@@ -13,6 +13,15 @@ from src.services.radarr import Radarr
 from src.services.sonarr import Sonarr
 from src.services.plex import Plex
 from src.services.transmission import check_transmission_and_trigger_scans
+from src.services.datastore import get_data_store
+from src.services.arr import get_lookup_cache, single_flight_stats
+from src.services.library import get_library
+from src.services.limiter import BACKGROUND, get_limiter
+
+
+# Shared by every Schedule instance: the periodic check and webhook triggered
+# checks never handle the same notify entries at the same time
+_notify_lock = asyncio.Lock()
 
 
 class Schedule:
@@ -22,18 +31,16 @@ class Schedule:
         # Set default values
         self.log = logger
         self.function = functions
-        self.radarr = Radarr(logger)
-        self.sonarr = Sonarr(logger)
+        self.radarr = Radarr(logger, BACKGROUND)
+        self.sonarr = Sonarr(logger, BACKGROUND)
         self.plex = Plex(logger)
 
-        # Set data.json file based on live/dev arg
-        self.data_json = "data.json" if args.env == "live" else "data.dev.json"
+        # Set data store based on live/dev arg
+        self.data_store = get_data_store(args, logger)
 
-    async def check_notify_list(self, context: CallbackContext) -> None:
-        """ Checks if someone needs to be notified from the JSON notify list """
+    async def check_transmission(self, context: CallbackContext) -> None:
+        """ Checks Transmission health, if it just recovered this triggers Radarr/Sonarr missing-media scans """
 
-        # Check Transmission health on every schedule tick.
-        # If it just recovered, this will trigger Radarr/Sonarr missing-media scans.
         try:
             await check_transmission_and_trigger_scans(
                 logger=self.log,
@@ -44,124 +51,191 @@ class Schedule:
             # Never fail the schedule job because of Transmission.
             pass
 
-        # Load JSON file
-        async with aiofiles.open(self.data_json, "r") as file:
-            data = json.loads(await file.read())
 
-        # track whether we need to write JSON back
-        changed = False
+    async def check_notify_list(self, context: CallbackContext) -> None:
+        """ Checks if someone needs to be notified from the JSON notify list """
+
+        # Load the notify list grouped by media, every change below is written to the data store right away
+        notify_index = await self.data_store.notify_index()
+        user_names = {}
 
-        # Iterate through notify_list
-        for user_id, media_types in data.get("notify_list", {}).items():
+        # Skip a backend whose circuit breaker is open instead of failing every entry,
+        # unless its library mirror can still answer the lookups
+        radarr_up = self.radarr.is_available() or get_library(self.radarr.label).ready
+        sonarr_up = self.sonarr.is_available() or get_library(self.sonarr.label).ready
+        if not radarr_up or not sonarr_up:
+            await self.log.logger(f"Notify check skips{' Radarr' if not radarr_up else ''}{' Sonarr' if not sonarr_up else ''}, circuit breaker open", False, "warning", False)
+        films = notify_index["film"] if radarr_up else {}
+        serie_ids = dict.fromkeys([*notify_index["serie"], *notify_index["recurring_serie"], *notify_index["serie_episode"]]) if sonarr_up else {}
 
-            # Set usernames
-            user_name_raw = data.get("user_id", {}).get(str(user_id), "Unknown, Unknown")
-            name_parts = [p.strip() for p in user_name_raw.split(",", 1)]
-            gebruiker = name_parts[0]
-            username = name_parts[1]
-
-            # Ensure keys exist
-            media_types.setdefault("serie", {})
-            media_types.setdefault("film", {})
-            media_types.setdefault("recurring_serie", {})
-            media_types.setdefault("serie_episode", {})
-
-            # Itarate through serie and movie options
-            for media_type in ["serie", "film"]:
-                # Iterate through all media ID's
-                for media_id, timestamp in list(media_types[media_type].items()):
-
-                    # Get JSON data for the media ID
-                    media_json = await self.sonarr.lookup_by_tmdbid(media_id) if media_type == "serie" else await self.radarr.lookup_by_tmdbid(media_id)
-
-                    # do the required checks
-                    check, media_folder, media_json = await self.check_requirements(media_json, media_id)
-                    if not check:
-                        continue
-
-                    # Check if all episodes are downloaded
-                    if media_type == "serie":
-                        total_seasons = self.effective_season_count(media_json)
-
-                        # Build required season tags: {"S01", "S02", ...}
-                        required = {f"S{n:02d}" for n in range(1, total_seasons + 1)}
-
-                        # Get amount of seasons
-                        found, count = self.seasons_present_in_folder(media_folder)
-
-                        # If any required season is missing, skip
-                        if found < required:
-                            continue
-
-                    # Check if media_folder contains any files or subdirectories
-                    if any(media_folder.iterdir()):
-                        # Get Plex URL
-                        media_plex_url = await self.plex.get_media_url(media_json, media_type)
-
-                        # Sanitize title and set a var
-                        sanitize_title = self.function.sanitize_text(media_json['title'])
-
-                        # Send message
-                        if not media_plex_url:
-                            await self.function.send_message(f"Goed nieuws! 🎉\n\nDe {media_type} die je hebt aangevraagd, *{sanitize_title}*, staat nu online op Plęx. Veel kijkplezier! 😎", user_id, context, None, "MarkdownV2", False)
-                        else:
-                            await self.function.send_message(f"Goed nieuws! 🎉\n\nDe {media_type} die je hebt aangevraagd, <b>{sanitize_title}</b>, staat nu online op Plęx. Veel kijkplezier! 😎\n\n🌐 <a href='{media_plex_url}'>Bekijk {sanitize_title} in de browser</a>", user_id, context, None, "HTML", False)
-                        # Write to log
-                        await self.log.logger(f"*ℹ️ User notified: The {media_type} {sanitize_title} ({media_id}) is online ℹ️*\nUser ID: {user_id}\nGebuiker: {gebruiker}\nUsername: {username}", False, "info")
-
-                        # If it's a series: initialize recurring tracking
-                        if media_type == "serie":
-                            ended = bool(media_json.get("ended", False))
-
-                            if not ended:
-                                # Only do this if serie_episode tracking exists; otherwise skip
-                                if "serie_episode" not in media_types:
-                                    continue
-
-                                seasons_name, seasons_count = self.seasons_present_in_folder(media_folder)
-                                max_seen = max(seasons_count) if seasons_count else 0
-
-                                # Initialize serie_episode tracking so we don't spam old episodes.
-                                latest_ep = self.newest_episode_in_folder(media_folder)
-                                media_types["serie_episode"].setdefault(str(media_id), {})
-                                media_types["serie_episode"][str(media_id)]["started"] = True
-                                media_types["serie_episode"][str(media_id)]["last"] = latest_ep or "S00E00"
-
-                                # Create/update recurring state for this serie
-                                media_types["recurring_serie"].setdefault(str(media_id), {})
-                                media_types["recurring_serie"][str(media_id)]["last_notified_season"] = max_seen
-                                media_types["recurring_serie"][str(media_id)]["last_seen_season"] = max_seen
-                            else:
-                                media_types.get("recurring_serie", {}).pop(str(media_id), None)
-                                media_types.get("serie_episode", {}).pop(str(media_id), None)
-
-                        # Delete the entry and write to data.json
-                        del data["notify_list"][user_id][media_type][media_id]
-                        changed = True
-
-            # Itarate through recurring_serie options
-            for media_id, state in list(media_types.get("recurring_serie", {}).items()):
-
-                media_json = await self.sonarr.lookup_by_tmdbid(media_id)
-
-                # do the required checks
-                check, media_folder, media_json = await self.check_requirements(media_json, media_id)
-                if not check:
-                    continue
+        # Films: one Radarr lookup per film, no matter how many users are waiting for it
+        for media_id in films:
+            await self.check_media(context, "film", media_id, user_names)
 
-                seasons_name, seasons_count = self.seasons_present_in_folder(media_folder)
-                if not seasons_count:
-                    continue
+        # Series: one Sonarr lookup and folder scan per serie, shared by all serie, recurring_serie and serie_episode subscribers
+        for media_id in serie_ids:
+            await self.check_media(context, "serie", media_id, user_names)
+
+        # Debug log of the lookup cache, request coalescing and concurrency limits
+        cache_stats = get_lookup_cache().stats()
+        flight_stats = single_flight_stats()
+        radarr_limit, sonarr_limit = get_limiter(self.radarr.label).stats(), get_limiter(self.sonarr.label).stats()
+        await self.log.logger(f"Notify check done. Lookup cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['size']} entries. Arr GETs: {flight_stats['requests']} sent, {flight_stats['saved']} duplicates coalesced. Concurrency limit: Radarr {radarr_limit['limit']}, Sonarr {sonarr_limit['limit']}", False, "info", False)
+
+
+    async def check_history(self, context: CallbackContext) -> None:
+        """
+        Checks the notify list of the films/series Radarr/Sonarr imported since the last run.
+        The checkpoint per backend is kept in bot_data, so it survives a restart.
+        """
+
+        checkpoints = context.bot_data.setdefault("history_checkpoint", {})
+
+        for media_type, media_handler in (("film", self.radarr), ("serie", self.sonarr)):
+
+            # First run: start from now, the full check covers everything before
+            since = checkpoints.get(media_handler.label)
+            if since is None:
+                checkpoints[media_handler.label] = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+                continue
+
+            # Keep the checkpoint if the request failed, the next run asks again
+            history = await media_handler.history_since(since)
+            if history is None:
+                continue
+
+            # One check per imported film/serie, no matter how many files were imported
+            library = get_library(media_handler.label)
+            media_ids = {}
+            for record in history:
+                media = record.get("movie") or record.get("series") or {}
+                tmdb_id = media.get("tmdbId") or library.tmdbid_of(record.get("movieId") or record.get("seriesId"))
+                if tmdb_id:
+                    media_ids[str(tmdb_id)] = None
+
+            for media_id in media_ids:
+                await self.check_media(context, media_type, media_id)
+
+            # history/since includes the checkpoint itself, checking an import twice is harmless
+            dates = [record["date"] for record in history if record.get("date")]
+            if dates:
+                checkpoints[media_handler.label] = max(dates)
+
+            if media_ids:
+                await self.log.logger(f"History check: {len(history)} {media_handler.label} import(s) since {since}, checked {len(media_ids)} {media_type}(s)", False, "info", False)
+
+
+    @staticmethod
+    def history_interval() -> int:
+        """ Seconds between history checks, HISTORY_CHECK_INTERVAL in dot-env, 0 disables them """
+        try:
+            interval = int(os.getenv("HISTORY_CHECK_INTERVAL", "300"))
+        except ValueError:
+            return 300
+        return max(60, interval) if interval > 0 else 0
+
+
+    async def check_media(self, context: CallbackContext, media_type: str, media_id: str, user_names: dict | None = None) -> None:
+        """ Notifies every subscriber of one film/serie whose files are online, used by the schedule and the webhook """
+
+        # One check at a time, so the schedule and a webhook never notify the same user twice
+        async with _notify_lock:
+            media_subscribers = await self.data_store.media_subscribers(media_id)
+            if user_names is None:
+                user_names = {}
+
+            if media_type == "film":
+                if media_subscribers["film"]:
+                    await self.check_film(context, media_id, media_subscribers["film"], user_names)
+            elif any(media_subscribers[kind] for kind in ("serie", "recurring_serie", "serie_episode")):
+                await self.check_serie(context, media_id, media_subscribers, user_names)
+
+
+    async def check_film(self, context: CallbackContext, media_id: str, subscribers: dict, user_names: dict) -> None:
+        """ Notifies the subscribers of a film once its folder has files """
+
+        # Get JSON data for the media ID
+        media_json = await self.radarr.lookup_by_tmdbid(media_id)
+
+        # do the required checks
+        check, media_folder, media_json = await self.check_requirements(media_json, media_id)
+        if not check:
+            return
+
+        # Check if media_folder contains any files or subdirectories
+        if not any(media_folder.iterdir()):
+            return
 
-                max_seen = max(seasons_count)
+        media_plex_url = await self.plex.get_media_url(media_json, "film")
+        for user_id in subscribers:
+            await self.notify_online(context, user_id, "film", media_id, media_json, media_plex_url, user_names)
+
+            # Delete the entry from the notify list
+            await self.data_store.remove_notify(user_id, "film", media_id)
+
+
+    async def check_serie(self, context: CallbackContext, media_id: str, media_subscribers: dict, user_names: dict) -> None:
+        """ Notifies serie, recurring_serie and serie_episode subscribers of one serie """
+
+        media_json = await self.sonarr.lookup_by_tmdbid(media_id)
+
+        # do the required checks
+        check, media_folder, media_json = await self.check_requirements(media_json, media_id)
+        if not check:
+            return
+
+        seasons_name, seasons_count = self.seasons_present_in_folder(media_folder)
+        episodes_found = self.function.episodes_present_in_folder(media_folder)
+        sanitize_title = self.function.sanitize_text(media_json["title"])
+        media_plex_url = None
+
+        # Users notified below start tracking from the current folder state, skip them for recurring/episode checks
+        notified = set()
+
+        # Serie requests: notify once all aired seasons are present
+        subscribers = media_subscribers["serie"]
+        if subscribers:
+            total_seasons = self.effective_season_count(media_json)
+
+            # Build required season tags: {"S01", "S02", ...}
+            required = {f"S{n:02d}" for n in range(1, total_seasons + 1)}
+
+            # Only notify if no required season is missing and the folder isn't empty
+            if not seasons_name < required and any(media_folder.iterdir()):
+                media_plex_url = await self.plex.get_media_url(media_json, "serie")
+                ended = bool(media_json.get("ended", False))
+                max_seen = max(seasons_count) if seasons_count else 0
+                latest_ep = max(episodes_found) if episodes_found else None
+
+                for user_id in subscribers:
+                    await self.notify_online(context, user_id, "serie", media_id, media_json, media_plex_url, user_names)
+
+                    # Initialize recurring tracking so we don't spam old seasons/episodes
+                    if not ended:
+                        await self.data_store.set_episode_state(user_id, media_id, True, latest_ep or "S00E00")
+                        await self.data_store.set_recurring_state(user_id, media_id, max_seen, max_seen)
+                    else:
+                        await self.data_store.remove_recurring_state(user_id, media_id)
+                        await self.data_store.remove_episode_state(user_id, media_id)
+
+                    # Delete the entry from the notify list
+                    await self.data_store.remove_notify(user_id, "serie", media_id)
+                    notified.add(user_id)
+
+        # Recurring series: notify if we see a new season number in files
+        if seasons_count:
+            max_seen = max(seasons_count)
+
+            for user_id, state in media_subscribers["recurring_serie"].items():
+                if user_id in notified:
+                    continue
 
                 last_notified = int(state.get("last_notified_season", 0))
                 last_seen = int(state.get("last_seen_season", 0))
 
-                # Notify if we see a new season number in files
                 if max_seen > last_notified:
-                    sanitize_title = self.function.sanitize_text(media_json["title"])
-                    media_plex_url = await self.plex.get_media_url(media_json, "serie")
+                    if media_plex_url is None:
+                        media_plex_url = await self.plex.get_media_url(media_json, "serie")
 
                     new_seasons = sorted(s for s in seasons_count if s > last_notified)
                     if len(new_seasons) == 1:
@@ -174,41 +248,29 @@ class Schedule:
                     else:
                         await self.function.send_message(f"Goed nieuws! 🎉\n\n<b>{season_text.capitalize()}</b> van <b>{sanitize_title}</b> is nu beschikbaar. Veel kijkplezier! 😎\n\n🌐 <a href='{media_plex_url}'>Bekijk {sanitize_title} in de browser</a>", user_id, context, None, "HTML", False)
 
+                    gebruiker, username = await self.user_name(user_id, user_names)
                     await self.log.logger(f"*ℹ️ Notify: New season(s) for serie {sanitize_title}: {season_text} ℹ️*\nUser ID: {user_id}\nGebuiker: {gebruiker}\nUsername: {username}", False, "info")
 
-                    state["last_notified_season"] = max_seen
-                    changed = True
+                    await self.data_store.set_recurring_state(user_id, media_id, last_notified_season=max_seen)
 
                 # Always update last_seen_season if it increased
                 if max_seen > last_seen:
-                    state["last_seen_season"] = max_seen
-                    changed = True
-
-            # Iterate through serie_episode options (new episode notifications)
-            for media_id, state in list(media_types.get("serie_episode", {}).items()):
+                    await self.data_store.set_recurring_state(user_id, media_id, last_seen_season=max_seen)
 
-                media_json = await self.sonarr.lookup_by_tmdbid(media_id)
+        # Serie episodes: notify about episodes newer than the last notified one
+        if episodes_found:
+            newest_found = max(episodes_found)
 
-                # do the required checks
-                check, media_folder, media_json = await self.check_requirements(media_json, media_id)
-                if not check:
+            for user_id, state in media_subscribers["serie_episode"].items():
+                if user_id in notified:
                     continue
 
                 # Only start notifying after started=True
                 if not bool((state or {}).get("started", False)):
                     continue
 
-                episodes_found = self.function.episodes_present_in_folder(media_folder)
-                if not episodes_found:
-                    continue
-
-                # Get highest option
-                newest_found = max(episodes_found)
-
-                # Get last notified from json
-                last_notified = (state or {}).get("last", "S00E00").upper()
-
                 # Only notify when newer episodes exist
+                last_notified = (state or {}).get("last", "S00E00").upper()
                 if newest_found <= last_notified:
                     continue
 
@@ -217,8 +279,8 @@ class Schedule:
                 if not new_episodes:
                     continue
 
-                sanitize_title = self.function.sanitize_text(media_json["title"])
-                media_plex_url = await self.plex.get_media_url(media_json, "serie")
+                if media_plex_url is None:
+                    media_plex_url = await self.plex.get_media_url(media_json, "serie")
 
                 # Generate episode list text
                 eps_text = self.format_episode_list(new_episodes)
@@ -228,16 +290,38 @@ class Schedule:
                 else:
                     await self.function.send_message(f"Goed nieuws! 🎉\n\nNieuwe aflevering(en) van <b>{sanitize_title}</b> zijn nu beschikbaar:\n\n<b>{eps_text}</b>\n\nVeel kijkplezier! 😎\n\n🌐 <a href='{media_plex_url}'>Bekijk {sanitize_title} in de browser</a>", user_id, context, None, "HTML", False)
 
+                gebruiker, username = await self.user_name(user_id, user_names)
                 await self.log.logger(f"*ℹ️ Notify: New episode(s) for serie {sanitize_title}: {eps_text} ℹ️*\n" f"User ID: {user_id}\nGebuiker: {gebruiker}\nUsername: {username}", False, "info")
 
                 # Update last notified
-                state["last"] = new_episodes[-1]
-                changed = True
+                await self.data_store.update_episode_last(user_id, media_id, new_episodes[-1])
+
+
+    async def notify_online(self, context: CallbackContext, user_id: str, media_type: str, media_id: str, media_json: dict, media_plex_url: str | None, user_names: dict) -> None:
+        """ Tells a user the film/serie they requested is online """
+
+        # Sanitize title and set a var
+        sanitize_title = self.function.sanitize_text(media_json['title'])
+
+        # Send message
+        if not media_plex_url:
+            await self.function.send_message(f"Goed nieuws! 🎉\n\nDe {media_type} die je hebt aangevraagd, *{sanitize_title}*, staat nu online op Plęx. Veel kijkplezier! 😎", user_id, context, None, "MarkdownV2", False)
+        else:
+            await self.function.send_message(f"Goed nieuws! 🎉\n\nDe {media_type} die je hebt aangevraagd, <b>{sanitize_title}</b>, staat nu online op Plęx. Veel kijkplezier! 😎\n\n🌐 <a href='{media_plex_url}'>Bekijk {sanitize_title} in de browser</a>", user_id, context, None, "HTML", False)
 
-        # Write back once per run
-        if changed:
-            async with aiofiles.open(self.data_json, "w") as file:
-                await file.write(json.dumps(data, indent=4))
+        # Write to log
+        gebruiker, username = await self.user_name(user_id, user_names)
+        await self.log.logger(f"*ℹ️ User notified: The {media_type} {sanitize_title} ({media_id}) is online ℹ️*\nUser ID: {user_id}\nGebuiker: {gebruiker}\nUsername: {username}", False, "info")
+
+
+    async def user_name(self, user_id: str, user_names: dict) -> tuple[str, str]:
+        """ Returns (gebruiker, username), cached for the duration of one run """
+
+        if user_id not in user_names:
+            user_name_raw = await self.data_store.get_user(user_id) or "Unknown, Unknown"
+            name_parts = [p.strip() for p in user_name_raw.split(",", 1)]
+            user_names[user_id] = (name_parts[0], name_parts[1] if len(name_parts) > 1 else "Unknown")
+        return user_names[user_id]
 
 
     def effective_season_count(self, media_json: dict) -> int:
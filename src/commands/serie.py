@@ -1,9 +1,6 @@
 #!/usr/bin/python3
 
 import os
-import re
-import json
-import aiofiles
 from pathlib import Path
 from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -26,18 +23,9 @@ class Serie(Media):
 
         return {
             "downloading": {
-                # "condition": lambda serie, torrents: any(serie["title"].lower() in t.name.lower() for t in torrents),
-                "condition": lambda serie, torrents: any(
-                    re.search(
-                        r"\b" + r"[.\s_-]+".join(
-                            map(re.escape, serie["title"].split())
-                        ) + r"\b",
-                        t.name,
-                        re.IGNORECASE
-                    )
-                    for t in torrents
-                ),
-                "message": "{title} wordt op dit moment al gedownløad, nog even geduld 😄",
+                # Exact match on the Radarr/Sonarr id in the download queue
+                "condition": lambda serie, queue: serie.get("id") in queue,
+                "message": "{title} wordt op dit moment al gedownløad{progress}, nog even geduld 😄",
                 "state_message": True,
                 "next_state": SERIE_NOTIFY
             },
@@ -60,7 +48,6 @@ class Serie(Media):
                 "size_check": True,
                 "message": "De downløad voor {title} is nu gestart, gemiddeld duurt het 1 uur voordat een serie online staat, nog even geduld 😄",
                 "action": "start_download",
-                "extra_action": "scan_missing_media",
                 "state_message": True,
                 "next_state": SERIE_NOTIFY
             },
@@ -196,22 +183,6 @@ class Serie(Media):
             await self.log.logger(f"Media JSON:\n{context.user_data['aanmeld_data']}", False, "error", False)
             return ConversationHandler.END
 
-        # Load JSON
-        async with aiofiles.open(self.data_json, "r") as f:
-            data = json.loads(await f.read())
-
-        # Ensure structure exists
-        notify_list = data.setdefault("notify_list", {})
-        user_node = notify_list.setdefault(str(update.effective_user.id), {})
-        user_node.setdefault("film", {})
-        user_node.setdefault("serie", {})
-        user_node.setdefault("recurring_serie", {})
-        serie_episode = user_node.setdefault("serie_episode", {})
-
-        # Create/update entry
-        entry = serie_episode.setdefault(serie_id, {})
-        entry["started"] = False
-
         # Set to newest episode available
         try:
             path = (context.user_data.get("media_data") or {}).get("path")
@@ -219,15 +190,13 @@ class Serie(Media):
                 raise KeyError("path")
             media_folder = Path(path)
             latest = max(self.function.episodes_present_in_folder(media_folder), default="S00E00")
-            entry["last"] = latest
         except (KeyError, TypeError, ValueError) as e:
-            entry["last"] = "S00E00"
+            latest = "S00E00"
             await self.log.logger(f"*ℹ️ No Path is found in JSON for {self.function.sanitize_text(str(e))}. See logs for more details.", False, "error")
             await self.log.logger(f"Media JSON:\n{context.user_data.get('media_data')}", False, "error", False)
 
-        # Save JSON
-        async with aiofiles.open(self.data_json, "w") as f:
-            await f.write(json.dumps(data, indent=4))
+        # Create/update entry
+        await self.data_store.set_episode_state(update.effective_user.id, serie_id, False, latest)
 
         title = context.user_data['media_data'].get("title", "")
         await self.function.send_message(f"✅ Je bent nu aangemeld voor nieuwe afleveringen van *{self.function.sanitize_text(title)}*.", update, context)
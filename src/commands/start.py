@@ -1,14 +1,13 @@
 #!/usr/bin/python3
 
-import json
 import asyncio
-import aiofiles
-from datetime import datetime
 from typing import Union, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext, ConversationHandler
 
 from src.states import VERIFY, REQUEST_ACCOUNT, REQUEST_MOVIE, REQUEST_SERIE, VERIFY_PWD
+from src.services.datastore import get_data_store
+from src.services.stats import get_stats_log
 
 
 class Start:
@@ -21,9 +20,9 @@ class Start:
         self.mode = getattr(args, "mode", "normal")
         self.maintenance = maintenance
 
-        # Set data.json/stats.json file based on live/dev arg
-        self.data_json = "data.json" if args.env == "live" else "data.dev.json"
-        self.stats_json = "stats.json" if args.env == "live" else "stats.dev.json"
+        # Set data store and stats log based on live/dev arg
+        self.data_store = get_data_store(args, logger)
+        self.stats = get_stats_log(args, logger)
 
     async def start_msg(self, update: Update, context: CallbackContext) -> int:
 
@@ -82,34 +81,23 @@ class Start:
             context.user_data["media_option"] = update.callback_query.data
             await update.callback_query.answer()
 
-        # Load JSON file
-        async with aiofiles.open(self.data_json, "r") as file:
-            json_data = json.loads(await file.read())
-
         # Check if user is blocked
-        if str(update.effective_user.id) in json_data["blocked_users"]:
+        if await self.data_store.is_blocked(update.effective_user.id):
             await self.function.send_message(f"Je bent geblokkeerd om deze bot te gebruiken, als je denkt dat dit een fout is kan je contact opnemen met de serverbeheerder.", update, context)
             await self.log.logger(f"*ℹ️ A blocked user tried to login ℹ️*\nUsername: {update.effective_user.first_name}\nUser ID: {update.effective_user.id}", False, "info")
             # Finish the conversation
             return ConversationHandler.END
 
         # Check if user_id is already known and verified
-        if str(update.effective_user.id) in json_data["user_id"]:
+        known_user = await self.data_store.get_user(update.effective_user.id)
+        if known_user is not None:
 
             # Set gebruikernaam if not set
             if not context.user_data.get("gebruiker"):
-                context.user_data["gebruiker"] = json_data.get("user_id", {}).get(str(update.effective_user.id)).split(",", 1)[0].strip()
-
-            # write to stats.json
-            async with aiofiles.open(self.stats_json, "r+") as file:
-                data = json.loads(await file.read())
-                data.setdefault(str(update.effective_user.id), {
-                                "logins": {}, "film_requests": {}, "serie_requests": {}})
-                data[str(update.effective_user.id)]["logins"][datetime.now().strftime(
-                    "%d-%m-%Y %H:%M:%S")] = update.effective_user.first_name
-                await file.seek(0)
-                await file.write(json.dumps(data, indent=4))
-                await file.truncate()
+                context.user_data["gebruiker"] = known_user.split(",", 1)[0].strip()
+
+            # Write the login to the stats log
+            await self.stats.log_login(update.effective_user.id, update.effective_user.first_name)
 
             # Return to the next state
             return await self.parse_request(update, context)
@@ -125,42 +113,24 @@ class Start:
 
     async def verify_pwd(self, update: Update, context: CallbackContext) -> Optional[int]:
 
-        # Load JSON file
-        async with aiofiles.open(self.data_json, "r") as file:
-            json_data = json.loads(await file.read())
-
-        # Check if given password is known in json
-        for key, value in json_data["users"].items():
-            if value == update.message.text:
-                await self.log.logger(f"*ℹ️ First time login for user ℹ️*\nGebruiker: {key}\nUsername: {update.effective_user.first_name}\nUser ID: {update.effective_user.id}", False, "info")
-                await self.function.send_message(f"Je wachtwoord klopt!\n\nJe bent nu ingelogd als gebruiker: {key}", update, context)
-                await asyncio.sleep(1)
-
-                # Set username to user_context
-                context.user_data["gebruiker"] = key
-
-                # Write user_id to json
-                json_data["user_id"][str(update.effective_user.id)] = f"{key}, {update.effective_user.first_name}"
-                # Default: user is subscribed to general update messages
-                json_data.setdefault("update_messages", {})
-                json_data["update_messages"][str(update.effective_user.id)] = True
-                async with aiofiles.open(self.data_json, "w") as file:
-                    await file.write(json.dumps(json_data, indent=4))
-
-                # Create user in stats.json
-                async with aiofiles.open(self.stats_json, "r+") as file:
-                    data = json.loads(await file.read())
-                    data[str(update.effective_user.id)] = {
-                        "logins": {datetime.now().strftime("%d-%m-%Y %H:%M:%S"): update.effective_user.first_name},
-                        "film_requests": {},
-                        "serie_requests": {}
-                    }
-                    await file.seek(0)
-                    await file.write(json.dumps(data, indent=4))
-                    await file.truncate()
-
-                # Return to the next state
-                return await self.parse_request(update, context)
+        # Check if given password is known in the data store
+        key = await self.data_store.find_user_by_password(update.message.text)
+        if key is not None:
+            await self.log.logger(f"*ℹ️ First time login for user ℹ️*\nGebruiker: {key}\nUsername: {update.effective_user.first_name}\nUser ID: {update.effective_user.id}", False, "info")
+            await self.function.send_message(f"Je wachtwoord klopt!\n\nJe bent nu ingelogd als gebruiker: {key}", update, context)
+            await asyncio.sleep(1)
+
+            # Set username to user_context
+            context.user_data["gebruiker"] = key
+
+            # Write user_id to the data store, by default subscribed to general update messages
+            await self.data_store.register_user(update.effective_user.id, key, update.effective_user.first_name)
+
+            # Write the first login to the stats log
+            await self.stats.log_login(update.effective_user.id, update.effective_user.first_name)
+
+            # Return to the next state
+            return await self.parse_request(update, context)
 
         # Bump wrong login tries
         context.user_data["login_tries"] += 1
@@ -170,10 +140,7 @@ class Start:
             # Send message and add to blocklist
             await self.log.logger(f"*ℹ️ User has been blocked ℹ️*\nUsername: {update.effective_user.first_name}\nUser ID: {update.effective_user.id}", False, "info")
             await self.function.send_message(f"Je hebt 3 keer het verkeerde wachtwoord ingevoerd, je bent nu geblokkerd. Neem contact op met de serverbeheerder om deze blokkade op te heffen.", update, context)
-            json_data["blocked_users"][str(
-                update.effective_user.id)] = update.effective_user.first_name
-            async with aiofiles.open(self.data_json, "w") as file:
-                await file.write(json.dumps(json_data, indent=4))
+            await self.data_store.block_user(update.effective_user.id, update.effective_user.first_name)
             # Finish the conversation
             return ConversationHandler.END
 
@@ -1,13 +1,12 @@
 #!/usr/bin/python3
 
-import json
 import asyncio
-import aiofiles
 from pathlib import Path
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext, ConversationHandler
 
 from src.services.sonarr import Sonarr
+from src.services.datastore import get_data_store
 from src.commands.schedule import Schedule
 
 from src.states import AFMELDEN_OPTIE, AANMELD_OPTIE, AANMELD_CHOICE
@@ -23,9 +22,8 @@ class Subscribe:
         self.sonarr = Sonarr(logger)
         self.schedule = Schedule(args, logger, self.function)
 
-        # Set data.json/stats.json file based on live/dev arg
-        self.data_json = "data.json" if args.env == "live" else "data.dev.json"
-        self.stats_json = "stats.json" if args.env == "live" else "stats.dev.json"
+        # Set data store based on live/dev arg
+        self.data_store = get_data_store(args, logger)
 
 
     async def aanmelden(self, update: Update, context: CallbackContext) -> int:
@@ -117,30 +115,12 @@ class Subscribe:
             await self.log.logger(f"Media JSON:\n{context.user_data['aanmeld_data']}", False, "error", False)
             return ConversationHandler.END
 
-        # Load JSON
-        async with aiofiles.open(self.data_json, "r") as f:
-            data = json.loads(await f.read())
-
-        # Ensure structure exists
-        notify_list = data.setdefault("notify_list", {})
-        user_node = notify_list.setdefault(str(update.effective_user.id), {})
-        user_node.setdefault("film", {})
-        user_node.setdefault("serie", {})
-        user_node.setdefault("recurring_serie", {})
-        serie_episode = user_node.setdefault("serie_episode", {})
-
-        # Create/update entry
-        entry = serie_episode.setdefault(serie_id, {})
-        entry["started"] = False
-
         # Set to newest episode available
         media_folder = Path(context.user_data['aanmeld_data']["path"])
         latest = max(self.function.episodes_present_in_folder(media_folder), default="S00E00")
-        entry["last"] = latest
 
-        # Save JSON
-        async with aiofiles.open(self.data_json, "w") as f:
-            await f.write(json.dumps(data, indent=4))
+        # Create/update entry
+        await self.data_store.set_episode_state(update.effective_user.id, serie_id, False, latest)
 
         title = context.user_data['aanmeld_data'].get("title", "")
         await self.function.send_message(f"✅ Je bent nu aangemeld voor nieuwe afleveringen van *{self.function.sanitize_text(title)}*.", update, context)
@@ -152,15 +132,8 @@ class Subscribe:
     async def afmelden(self, update: Update, context: CallbackContext) -> int:
         user_id = str(update.effective_user.id)
 
-        # Load JSON file
-        async with aiofiles.open(self.data_json, "r") as file:
-            data = json.loads(await file.read())
-
-        serie_episode = (
-            data.get("notify_list", {})
-                .get(user_id, {})
-                .get("serie_episode", {})
-        )
+        # Get the serie subscriptions of the user
+        serie_episode = await self.data_store.episode_subscriptions(user_id)
 
         if not serie_episode:
             await self.function.send_message("Je bent niet aangemeld voor serie updates, dus er is ook niks om voor af te melden. 😀",update, context)
@@ -192,19 +165,8 @@ class Subscribe:
         serie_id = query.data
         user_id = str(query.from_user.id)
 
-        # Load JSON
-        async with aiofiles.open(self.data_json, "r") as file:
-            data = json.loads(await file.read())
-
-        user_node = data.setdefault("notify_list", {}).setdefault(user_id, {})
-        serie_episode = user_node.setdefault("serie_episode", {})
-
         # Remove serie from list
-        serie_episode.pop(serie_id, None)
-
-        # Save JSON
-        async with aiofiles.open(self.data_json, "w") as file:
-            await file.write(json.dumps(data, indent=4))
+        await self.data_store.remove_episode_state(user_id, serie_id)
 
         # show title
         media_json = self.first_item(await self.sonarr.lookup_by_tmdbid(serie_id))
@@ -1,18 +1,227 @@
 #!/usr/bin/python3
 
 import aiohttp
+import codecs
+import copy
 import json
+import os
+import re
+import time
 import traceback
 import asyncio
-from typing import Union
+from collections import OrderedDict
+from urllib.parse import quote
+from typing import Any, AsyncIterator, Optional, Union
 from abc import ABC, abstractmethod
 from aiohttp import ClientError, ClientTimeout, ContentTypeError
 
+from src.services.arrcommands import PENDING_STATES, get_command_tracker
+from src.services.breaker import CircuitBreaker, HALF_OPEN, OPEN, backoff_delay, get_breaker
+from src.services.library import get_library, normalize_title
+from src.services.limiter import INTERACTIVE, Ticket, get_limiter
+
+
+# One pooled session per backend (movie/serie) for the whole process, shared
+# by every Radarr/Sonarr instance. Opened in the Application's post_init and
+# closed in post_stop; _session() opens one on demand for anything that runs
+# outside that window.
+_sessions: dict[str, aiohttp.ClientSession] = {}
+
+
+def _new_session() -> aiohttp.ClientSession:
+    """ Keep-alive session with a bounded connection pool and a DNS cache """
+
+    try:
+        limit = max(1, int(os.getenv("ARR_POOL_LIMIT", "10")))
+    except ValueError:
+        limit = 10
+
+    connector = aiohttp.TCPConnector(limit=limit, ttl_dns_cache=300, keepalive_timeout=60)
+    return aiohttp.ClientSession(connector=connector, timeout=ClientTimeout(total=30))
+
+
+async def open_arr_sessions() -> None:
+    """ Creates the shared Radarr and Sonarr sessions, used as post_init hook step """
+    for label in ("movie", "serie"):
+        if label not in _sessions or _sessions[label].closed:
+            _sessions[label] = _new_session()
+
+
+async def close_arr_sessions() -> None:
+    """ Closes the shared sessions, used as post_stop hook step """
+    for label, session in list(_sessions.items()):
+        if not session.closed:
+            await session.close()
+        del _sessions[label]
+
+
+class LookupCache:
+    """
+    Bounded LRU cache with a per-entry TTL for lookup_by_tmdbid responses.
+
+    Keys are (label, tmdb_id). Empty or failed lookups are cached with a
+    shorter TTL so a missing or broken entry isn't requested on every call,
+    but is retried soon. queue_download invalidates the entry it changed.
+    """
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float):
+
+        # Set default values
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: tuple) -> tuple[bool, Any]:
+        """ Returns (found, value), expired entries count as a miss """
+
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def set(self, key: tuple, value: Any) -> None:
+        ttl = self.ttl if value else self.negative_ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: tuple) -> None:
+        self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        """ Drops every entry whose key starts with prefix (e.g. all searches of one backend) """
+        for key in [key for key in self._entries if key[0] == prefix]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+# Fields of /movie and /series items the bot uses, the library mirror only keeps these
+LIBRARY_FIELDS = ("id", "title", "year", "tmdbId", "tvdbId", "imdbId", "path", "monitored", "hasFile", "status", "ended", "lastAired", "added", "statistics")
+
+_ARRAY_SEPARATORS = re.compile(r"[\s,]*")
+
+
+class ArrStreamError(Exception):
+    """ Raised by ArrApiHandler.get_stream when the listing can't be read completely """
+    pass
+
+
+async def iter_json_array(content: aiohttp.StreamReader, fields: Optional[tuple] = None, chunk_size: int = 65536) -> AsyncIterator[dict]:
+    """
+    Incrementally decodes a JSON array of objects from a response body and
+    yields one item at a time, projected to fields if given. Only the item
+    being decoded is buffered, never the whole body.
+    """
+
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+
+    async for chunk in content.iter_chunked(chunk_size):
+        buffer += text_decoder.decode(chunk)
+        pos = 0
+
+        if not started:
+            pos = _ARRAY_SEPARATORS.match(buffer, pos).end()
+            if pos >= len(buffer):
+                continue
+            if buffer[pos] != "[":
+                raise ValueError("Response is not a JSON array")
+            started = True
+            pos += 1
+
+        while True:
+            pos = _ARRAY_SEPARATORS.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                return
+            if buffer[pos] != "{":
+                raise ValueError(f"Unexpected {buffer[pos]!r} in JSON array")
+
+            # An incomplete object fails to decode, wait for the next chunk
+            try:
+                item, pos_end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break
+
+            yield {key: item[key] for key in fields if key in item} if fields else item
+            pos = pos_end
+
+        buffer = buffer[pos:]
+
+    raise ValueError("JSON array ended before the closing bracket")
+
+
+# GET requests that are in flight, keyed by URL, and how many duplicates they saved
+_inflight: dict[str, tuple[asyncio.Task, Ticket]] = {}
+_coalesced = {"requests": 0, "saved": 0}
+
+
+def single_flight_stats() -> dict:
+    """ Returns how many GETs were sent and how many duplicate GETs were coalesced """
+    return dict(_coalesced)
+
+
+# Shared by every Radarr/Sonarr instance, created on first use (after dot-env is loaded)
+_lookup_cache: Optional[LookupCache] = None
+
+
+def get_lookup_cache() -> LookupCache:
+    """ Returns the process-wide lookup cache, sized by ARR_LOOKUP_CACHE_* in dot-env """
+
+    global _lookup_cache
+    if _lookup_cache is None:
+        try:
+            max_size = max(1, int(os.getenv("ARR_LOOKUP_CACHE_SIZE", "1000")))
+            ttl = max(0.0, float(os.getenv("ARR_LOOKUP_CACHE_TTL", "600")))
+            negative_ttl = max(0.0, float(os.getenv("ARR_LOOKUP_CACHE_NEGATIVE_TTL", "60")))
+        except ValueError:
+            max_size, ttl, negative_ttl = 1000, 600.0, 60.0
+        _lookup_cache = LookupCache(max_size, ttl, negative_ttl)
+
+    return _lookup_cache
+
+
+_search_cache: Optional[LookupCache] = None
+
+
+def get_search_cache() -> LookupCache:
+    """ Returns the process-wide lookup_by_name cache, sized by ARR_SEARCH_CACHE_* in dot-env """
+
+    global _search_cache
+    if _search_cache is None:
+        try:
+            max_size = max(1, int(os.getenv("ARR_SEARCH_CACHE_SIZE", "200")))
+            ttl = max(0.0, float(os.getenv("ARR_SEARCH_CACHE_TTL", "300")))
+        except ValueError:
+            max_size, ttl = 200, 300.0
+        _search_cache = LookupCache(max_size, ttl, min(ttl, 60.0))
+
+    return _search_cache
+
+
+def normalize_query(term: str) -> str:
+    """ Folds case, punctuation and whitespace: 'The  Office!' and 'the office' give the same key """
+    return normalize_title(term)
+
 
 class ArrApiHandler(ABC):
     """ Base class for usage of the Radarr/Sonarr API """
 
-    def __init__(self, logger, token, base_url, label):
+    def __init__(self, logger, token, base_url, label, priority=INTERACTIVE):
 
         # Init the class
         self.log = logger
@@ -20,6 +229,9 @@ class ArrApiHandler(ABC):
         self.base_url = base_url
         self.label = label
 
+        # Scheduler instances pass BACKGROUND, so user requests go first in the limiter
+        self.priority = priority
+
     @abstractmethod
     async def lookup_by_name(self, media_name: str) -> Union[list[dict], dict]:
         """ Abstract method that does a media lookup in the subclass """
@@ -35,65 +247,214 @@ class ArrApiHandler(ABC):
         """ Abstract method that scans for missing monitored media in the subclass """
         pass
 
+    @abstractmethod
+    async def search_media(self, media_ids: list[int]) -> Union[list[dict], dict]:
+        """ Abstract method that searches only the given films/series in the subclass """
+        pass
+
+    def library_refresh_interval(self) -> int:
+        """ Seconds between library refreshes, ARR_LIBRARY_REFRESH in dot-env """
+        try:
+            return max(60, int(os.getenv("ARR_LIBRARY_REFRESH", "900")))
+        except ValueError:
+            return 900
+
+    async def get_stream(self, url_string: str, fields: Optional[tuple] = None) -> AsyncIterator[dict]:
+        """
+        Streams a JSON array response and yields the items while the body is still downloading.
+        Raises ArrStreamError on any failure, so a partial listing is never mistaken for a complete one.
+        """
+
+        # Build request URL (apikey via params to avoid leaking in logs)
+        url = f"{self.base_url}{url_string}"
+        params = {"apikey": self.token}
+
+        # Fail fast while the backend is known to be down
+        breaker = get_breaker(self.label)
+        if not breaker.allow():
+            raise ArrStreamError(f"{self.label} API circuit breaker is {breaker.state} - URL: {url}")
+
+        # A cancelled half-open trial gives its claim back
+        trial = breaker.state == HALF_OPEN
+        try:
+            session = self._session()
+            async with get_limiter(self.label).slot(self.priority) as call, session.get(url, params=params) as response:
+                call.failed = response.status >= 500
+                if not 200 <= response.status < 300:
+                    if response.status >= 500:
+                        await self._breaker_failure(breaker)
+                    else:
+                        await self._breaker_success(breaker)
+                    raise ArrStreamError(f"Not OK response for {self.label} API GET. Error: {response.status} {response.reason} - URL: {url}")
+
+                await self._breaker_success(breaker)
+                async for item in iter_json_array(response.content, fields):
+                    yield item
+
+        except (ClientError, asyncio.TimeoutError) as e:
+            await self._breaker_failure(breaker)
+            raise ArrStreamError(f"Error during {self.label} API GET request. Error: {' '.join(map(str, e.args))} - URL: {url}") from e
+        except ValueError as e:
+            raise ArrStreamError(f"Invalid JSON from {self.label} API. Error: {e} - URL: {url}") from e
+        finally:
+            if trial:
+                breaker.release()
+
+    async def refresh_library(self, context=None) -> None:
+        """ Streams the complete local library in one request and updates the mirror, used as job_queue callback """
+
+        # Create the correct url label
+        url_label = "series" if self.label == "serie" else "movie"
+
+        # Stream the listing, only the fields the bot uses are kept
+        try:
+            items = [item async for item in self.get_stream(f"/{url_label}?", LIBRARY_FIELDS)]
+        except ArrStreamError as e:
+            # Keep the current mirror, it goes stale after 3 missed refreshes
+            await self.log.logger(f"Could not refresh the {self.label} library mirror. {e}", False, "warning", False)
+            return
+
+        library = get_library(self.label)
+        library.max_age = 3 * self.library_refresh_interval()
+        counts = library.replace(items)
+        await self.log.logger(f"{self.label.capitalize()} library mirror refreshed: {counts['total']} items, {counts['added']} added, {counts['changed']} changed, {counts['removed']} removed", False, "info", False)
+
+    def cached_search(self, term: str) -> tuple[bool, Any]:
+        """ Returns (found, results) from the search cache, the results are a private copy """
+        found, results = get_search_cache().get((self.label, normalize_query(term)))
+        return found, copy.deepcopy(results)
+
+    def library_search(self, term: str) -> Optional[list[dict]]:
+        """
+        The library item whose title is the search term, for when the remote lookup failed.
+        Media that is already added can still be requested while the metadata service is down.
+        """
+        item = get_library(self.label).by_title(term)
+        return [copy.deepcopy(item)] if item is not None else None
+
+    def store_search(self, term: str, results: Any) -> None:
+        """ Caches a successful search, failed requests are not cached """
+        if isinstance(results, list):
+            get_search_cache().set((self.label, normalize_query(term)), copy.deepcopy(results))
+
+    def invalidate_lookup(self, tmdbid) -> None:
+        """ Drops the cached responses that still show the media as not added: its lookup and this backend's searches """
+        if tmdbid is not None:
+            get_lookup_cache().invalidate((self.label, str(tmdbid)))
+        get_search_cache().invalidate_prefix(self.label)
+
+    def _session(self) -> aiohttp.ClientSession:
+        """ Returns the shared session of this backend """
+        session = _sessions.get(self.label)
+        if session is None or session.closed:
+            session = _sessions[self.label] = _new_session()
+        return session
+
     async def get(self, url_string: str) -> Union[dict, bool]:
-        """ Handles the GET requests asynchronously using aiohttp """
+        """
+        Handles the GET requests, concurrent GETs for the same URL share one request.
+        Every caller gets its own copy of the response.
+        """
+
+        url = f"{self.base_url}{url_string}"
+        if url in _inflight:
+            # The shared request runs at the highest priority of its callers
+            task, ticket = _inflight[url]
+            ticket.raise_to(self.priority)
+            _coalesced["saved"] += 1
+            return copy.deepcopy(await asyncio.shield(task))
+
+        # The request keeps running if the first caller is cancelled, the others still wait for it
+        ticket = Ticket(self.priority)
+        task = asyncio.ensure_future(self._get(url_string, ticket))
+        _inflight[url] = (task, ticket)
+        task.add_done_callback(lambda _: _inflight.pop(url, None))
+        _coalesced["requests"] += 1
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def _get(self, url_string: str, ticket: Optional[Ticket] = None) -> Union[dict, bool]:
+        """ Handles the GET requests asynchronously using aiohttp, at the priority of ticket if given """
 
         # Build request URL (apikey via params to avoid leaking in logs)
         url = f"{self.base_url}{url_string}"
         params = {"apikey": self.token}
-        timeout = ClientTimeout(total=30)
 
-        # Make the async request
-        for attempt in range(1, 3 + 1):
-            try:
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    async with session.get(url, params=params) as response:
+        # Fail fast while the backend is known to be down
+        breaker = get_breaker(self.label)
+        if not breaker.allow():
+            await self.log.logger(f"{self.label} API circuit breaker is {breaker.state}, skipping GET - URL: {url}", False, "warning", False)
+            return False
+
+        # A cancelled half-open trial gives its claim back
+        trial = breaker.state == HALF_OPEN
+        try:
+            # Make the async request
+            retry_delay = 0.0
+            for attempt in range(1, 3 + 1):
+
+                # Back off after a 5xx answer, outside the concurrency slot
+                if retry_delay:
+                    await asyncio.sleep(retry_delay)
+                    retry_delay = 0.0
+
+                try:
+                    session = self._session()
+                    async with get_limiter(self.label).slot(self.priority, ticket) as call, session.get(url, params=params) as response:
+                        call.failed = response.status >= 500
 
                         # Continue if 2xx
                         if 200 <= response.status < 300:
+                            await self._breaker_success(breaker)
                             try:
                                 return await response.json()
                             except ContentTypeError:
                                 # Some endpoints may return non-JSON on success
                                 return {"raw": await response.text()}
 
-                        # Retry if 5xx
+                        # Retry if 5xx, unless other calls opened the breaker in the meantime
                         if response.status in (500, 502, 503, 504):
-                            if attempt < 3:
-                                await asyncio.sleep(3)
+                            if attempt < 3 and breaker.state != OPEN:
+                                retry_delay = backoff_delay(attempt)
                                 continue
                             else:
                                 await self.log.logger(
-                                    f"Not OK response for {self.label} API GET after 3 retries. Last error: {response.status} {response.reason} {await response.text()} - URL: {url}",
+                                    f"Not OK response for {self.label} API GET after {attempt} attempts. Last error: {response.status} {response.reason} {await response.text()} - URL: {url}",
                                     True, "error", False
                                 )
+                                await self._breaker_failure(breaker)
                                 return False
 
-                        # Return false in other cases not OK
+                        # Return false in other cases not OK, the backend did answer
+                        await self._breaker_success(breaker)
                         await self.log.logger(
                             f"Not OK response for {self.label} API GET. Error: {response.status} {response.reason} {await response.text()} - URL: {url}",
                             False, "error", False
                         )
                         return False
 
-            # Log and send Telegram message if anything went wrong
-            except (ClientError, asyncio.TimeoutError) as e:
-
-                if attempt < 3:
-                    await asyncio.sleep(3)
-                    continue
-
-                await self.log.logger(
-                    f"Error during {self.label} API GET request. Error: {' '.join(map(str, e.args))} - Traceback: {traceback.format_exc()} - URL: {url}",
-                    False, "error", False
-                )
-                return False
-            except Exception as e:
-                await self.log.logger(
-                    f"Unexpected error during {self.label} API GET request. Error: {' '.join(map(str, e.args))} - Traceback: {traceback.format_exc()} - URL: {url}",
-                    False, "error", False
-                )
-                return False
+                # Log and send Telegram message if anything went wrong
+                except (ClientError, asyncio.TimeoutError) as e:
+
+                    if attempt < 3 and breaker.state != OPEN:
+                        await asyncio.sleep(backoff_delay(attempt))
+                        continue
+
+                    await self.log.logger(
+                        f"Error during {self.label} API GET request. Error: {' '.join(map(str, e.args))} - Traceback: {traceback.format_exc()} - URL: {url}",
+                        False, "error", False
+                    )
+                    await self._breaker_failure(breaker)
+                    return False
+                except Exception as e:
+                    await self.log.logger(
+                        f"Unexpected error during {self.label} API GET request. Error: {' '.join(map(str, e.args))} - Traceback: {traceback.format_exc()} - URL: {url}",
+                        False, "error", False
+                    )
+                    await self._breaker_failure(breaker)
+                    return False
+        finally:
+            if trial:
+                breaker.release()
 
     async def post(self, url_string: str, payload: dict) -> Union[dict, bool]:
         """ Handles the POST requests asynchronously using aiohttp """
@@ -101,46 +462,145 @@ class ArrApiHandler(ABC):
         # Build request URL (apikey via params to avoid leaking in logs)
         url = f"{self.base_url}{url_string}"
         params = {"apikey": self.token}
-        timeout = ClientTimeout(total=30)
 
-        # Make the async request
-        for attempt in range(1, 3 + 1):
-            try:
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    async with session.post(url, params=params, json=payload) as response:
+        # Fail fast while the backend is known to be down
+        breaker = get_breaker(self.label)
+        if not breaker.allow():
+            await self.log.logger(f"{self.label} API circuit breaker is {breaker.state}, skipping POST - URL: {url} - Payload: {payload}", False, "warning", False)
+            return False
+
+        # A cancelled half-open trial gives its claim back
+        trial = breaker.state == HALF_OPEN
+        try:
+            # Make the async request
+            retry_delay = 0.0
+            for attempt in range(1, 3 + 1):
+
+                # Back off after a 5xx answer, outside the concurrency slot
+                if retry_delay:
+                    await asyncio.sleep(retry_delay)
+                    retry_delay = 0.0
+
+                try:
+                    session = self._session()
+                    async with get_limiter(self.label).slot(self.priority) as call, session.post(url, params=params, json=payload) as response:
+                        call.failed = response.status >= 500
+
                         # Continue if 2xx
                         if 200 <= response.status < 300:
+                            await self._breaker_success(breaker)
                             try:
                                 return await response.json()
                             except ContentTypeError:
                                 return {"raw": await response.text()}
 
-                        # Retry if 5xx
-                        if response.status in (500, 502, 503, 504) and attempt < 3:
-                            await asyncio.sleep(3)
+                        # Retry if 5xx, unless other calls opened the breaker in the meantime
+                        if response.status in (500, 502, 503, 504) and attempt < 3 and breaker.state != OPEN:
+                            retry_delay = backoff_delay(attempt)
                             continue
 
                         await self.log.logger(
                             f"Not OK response for {self.label} API POST. Error: {response.status} {response.reason} {await response.text()} - URL: {url} - Payload: {payload}",
                             False, "error", False
                         )
+                        if response.status in (500, 502, 503, 504):
+                            await self._breaker_failure(breaker)
+                        else:
+                            await self._breaker_success(breaker)
                         return False
 
-            except (ClientError, asyncio.TimeoutError) as e:
-                if attempt < 3:
-                    await asyncio.sleep(3)
-                    continue
-                await self.log.logger(
-                    f"Error during {self.label} API POST request. Error: {' '.join(map(str, e.args))} - Traceback: {traceback.format_exc()} - URL: {url} - Payload: {payload}",
-                    False, "error", False
-                )
-                return False
-            except Exception as e:
-                await self.log.logger(
-                    f"Unexpected error during {self.label} API POST request. Error: {' '.join(map(str, e.args))} - Traceback: {traceback.format_exc()} - URL: {url} - Payload: {payload}",
-                    False, "error", False
-                )
-                return False
+                except (ClientError, asyncio.TimeoutError) as e:
+                    if attempt < 3 and breaker.state != OPEN:
+                        await asyncio.sleep(backoff_delay(attempt))
+                        continue
+                    await self.log.logger(
+                        f"Error during {self.label} API POST request. Error: {' '.join(map(str, e.args))} - Traceback: {traceback.format_exc()} - URL: {url} - Payload: {payload}",
+                        False, "error", False
+                    )
+                    await self._breaker_failure(breaker)
+                    return False
+                except Exception as e:
+                    await self.log.logger(
+                        f"Unexpected error during {self.label} API POST request. Error: {' '.join(map(str, e.args))} - Traceback: {traceback.format_exc()} - URL: {url} - Payload: {payload}",
+                        False, "error", False
+                    )
+                    await self._breaker_failure(breaker)
+                    return False
+        finally:
+            if trial:
+                breaker.release()
+
+    async def post_command(self, payload: dict) -> Union[dict, bool]:
+        """
+        Posts a /command, unless the same command (name and arguments) posted
+        earlier is still queued or running; then that command is returned.
+        """
+
+        tracker = get_command_tracker(self.label)
+        key = tracker.key(payload)
+
+        async with tracker.lock:
+
+            # Ask Radarr/Sonarr how far the earlier command is
+            if tracker.pending(key) is not None:
+                await self._poll_command(tracker, key)
+                command = tracker.pending(key)
+                if command is not None:
+                    tracker.skipped += 1
+                    await self.log.logger(f"Skipped {self.label} command {payload.get('name')}, the same command is still {command.get('status')} (id {command.get('id')})", False, "info", False)
+                    return command
+
+            response = await self.post(f"/command?", payload)
+            if isinstance(response, dict) and response.get("id") is not None and response.get("status", "queued") in PENDING_STATES:
+                tracker.track(key, response)
+            return response
+
+    async def _poll_command(self, tracker, key: str) -> Optional[dict]:
+        """ Refreshes one tracked command, returns its durations if it finished """
+
+        # Already finished or forgotten by another caller
+        command = tracker.pending(key)
+        if command is None:
+            return None
+        current = await self.get(f"/command/{command['id']}?")
+
+        # Unknown to Radarr/Sonarr (e.g. restarted) or stuck for hours: stop waiting for it
+        if not isinstance(current, dict) or tracker.expired(key):
+            tracker.forget(key)
+            return None
+
+        finished = tracker.update(key, current)
+        if finished is not None:
+            await self.log.logger(f"{self.label.capitalize()} command {finished['name']} {finished['status']}: queued {finished['queue_seconds']}s, ran {finished['run_seconds']}s", False, "info", False)
+        return finished
+
+    async def poll_commands(self, context=None) -> None:
+        """ Refreshes every tracked command that is still pending, used as job_queue callback """
+
+        # Under the lock, so a post_command of the same command can't poll or forget it meanwhile
+        tracker = get_command_tracker(self.label)
+        finished = 0
+        async with tracker.lock:
+            for key in tracker.pending_keys():
+                finished += await self._poll_command(tracker, key) is not None
+
+        # Debug log of the command stats, only when a command finished in this round
+        if finished:
+            stats = tracker.stats()
+            averages = ", ".join(f"{name} {s['count']}x (queued {s['avg_queue_seconds']}s, ran {s['avg_run_seconds']}s)" for name, s in stats["finished"].items())
+            await self.log.logger(f"{self.label.capitalize()} commands: {stats['pending']} pending, {stats['skipped']} duplicates skipped. Averages: {averages}", False, "info", False)
+
+    def is_available(self) -> bool:
+        """ False while the circuit breaker of this backend fails calls fast """
+        return get_breaker(self.label).is_available()
+
+    async def _breaker_success(self, breaker: CircuitBreaker) -> None:
+        if breaker.record_success() is not None:
+            await self.log.logger(f"*✅ {self.label.capitalize()} API is reachable again ✅*", False, "info")
+
+    async def _breaker_failure(self, breaker: CircuitBreaker) -> None:
+        if breaker.record_failure():
+            await self.log.logger(f"*⚠️ {self.label.capitalize()} API is unreachable, requests fail fast for {round(breaker.cooldown)} seconds ⚠️*", False, "warning")
 
     async def get_disk_space(self) -> Union[list[dict], dict]:
         """ Makes a GET request to get the disk space """
@@ -158,13 +618,26 @@ class ArrApiHandler(ABC):
         return disks
 
     async def lookup_by_tmdbid(self, tmdbid: str) -> Union[list[dict], dict]:
-        """ Function that does a movie lookup by The Movie Database ID """
-
-        # Create the correct url label
-        url_label = "series" if self.label == "serie" else "movie"
-
-        # Build url_string and make the request
-        lookup = await self.get(f"/{url_label}/lookup?term=tmdb:{tmdbid}")
+        """ Function that does a movie lookup by The Movie Database ID, served from the lookup cache when possible """
+
+        # Media in the local library is answered from the mirror without a request
+        item = get_library(self.label).by_tmdbid(tmdbid)
+        if item is not None:
+            return [copy.deepcopy(item)]
+
+        # The mirror and the cache keep their own objects, callers get a copy
+        cache = get_lookup_cache()
+        found, lookup = cache.get((self.label, str(tmdbid)))
+        if found:
+            return copy.deepcopy(lookup) or None
+
+        # Media already added is read from the local library, only new media
+        # needs the lookup that goes through the remote metadata service
+        lookup = await self.local_lookup(tmdbid)
+        if lookup is None:
+            url_label = "series" if self.label == "serie" else "movie"
+            lookup = await self.get(f"/{url_label}/lookup?term=tmdb:{tmdbid}")
+        cache.set((self.label, str(tmdbid)), copy.deepcopy(lookup))
 
         # Check if return value is empty
         if not lookup:
@@ -174,3 +647,38 @@ class ArrApiHandler(ABC):
 
         # Return the data
         return lookup
+
+    async def local_lookup(self, tmdbid: str) -> Optional[list[dict]]:
+        """
+        Reads a film/serie that is already added from the local library endpoints,
+        None if it isn't in the library (or the library can't tell).
+        """
+
+        url_label = "series" if self.label == "serie" else "movie"
+
+        # The mirror knows the Radarr/Sonarr id, even when it is too old to answer itself
+        media_id = get_library(self.label).internal_id(tmdbid)
+        if media_id is not None:
+            item = await self.get(f"/{url_label}/{media_id}?")
+            if isinstance(item, dict) and str(item.get("tmdbId")) == str(tmdbid):
+                return [item]
+
+        # Radarr can filter its library on tmdbId, Sonarr only on tvdbId.
+        # A fresh mirror without the film already tells it isn't in the library.
+        if self.label == "movie" and not get_library(self.label).ready:
+            items = await self.get(f"/movie?tmdbId={tmdbid}")
+            if isinstance(items, list) and items:
+                return items
+
+        return None
+
+    async def history_since(self, since: str) -> Optional[list[dict]]:
+        """ Import events (downloadFolderImported) since an ISO date, None if the request failed """
+
+        if self.label == "serie":
+            url_string = f"/history/since?date={quote(since, safe='')}&eventType=downloadFolderImported&includeSeries=true&includeEpisode=true"
+        else:
+            url_string = f"/history/since?date={quote(since, safe='')}&eventType=downloadFolderImported&includeMovie=true"
+
+        history = await self.get(url_string)
+        return history if isinstance(history, list) else None
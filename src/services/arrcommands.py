@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Optional
+
+
+# One tracker per backend (movie/serie) for the whole process
+_trackers: dict[str, "CommandTracker"] = {}
+
+# Command states in which Radarr/Sonarr still has to do the work
+PENDING_STATES = ("queued", "started")
+
+# A command still pending after this many seconds is forgotten, so a stuck command doesn't block new ones
+MAX_PENDING_AGE = 6 * 3600
+
+
+def get_command_tracker(label: str) -> "CommandTracker":
+    """ Returns the process-wide command tracker of a backend """
+
+    if label not in _trackers:
+        _trackers[label] = CommandTracker(label)
+
+    return _trackers[label]
+
+
+class CommandTracker:
+    """
+    Remembers the /command requests posted to one Radarr/Sonarr backend.
+
+    Commands are keyed by their payload (name plus arguments, id lists
+    sorted), so the same search posted twice has the same key. While a
+    command with that key is queued or started a new post is skipped.
+    Finished commands leave their queue and run time in the per-command
+    stats. Posts go through lock, so two callers can't both post the
+    same command.
+    """
+
+    def __init__(self, label: str):
+
+        # Set default values
+        self.label = label
+        self.skipped = 0
+        self.lock = asyncio.Lock()
+        self._pending: dict[str, dict] = {}
+        self._tracked_at: dict[str, float] = {}
+        self._finished: dict[str, dict] = {}
+
+    @staticmethod
+    def key(payload: dict) -> str:
+        normalized = {name: sorted(value) if isinstance(value, list) else value for name, value in payload.items()}
+        return json.dumps(normalized, sort_keys=True)
+
+    def pending(self, key: str) -> Optional[dict]:
+        """ The tracked command for key, None if there is none """
+        return self._pending.get(key)
+
+    def pending_keys(self) -> list[str]:
+        return list(self._pending)
+
+    def track(self, key: str, command: dict) -> None:
+        self._pending[key] = command
+        self._tracked_at[key] = time.monotonic()
+
+    def forget(self, key: str) -> None:
+        self._pending.pop(key, None)
+        self._tracked_at.pop(key, None)
+
+    def expired(self, key: str) -> bool:
+        return time.monotonic() - self._tracked_at.get(key, 0) > MAX_PENDING_AGE
+
+    def update(self, key: str, command: dict) -> Optional[dict]:
+        """ Stores the polled state of a command, returns its durations once it finished """
+
+        # Only the command still tracked under key counts, a finished command is counted once
+        tracked = self._pending.get(key)
+        if tracked is None or tracked.get("id") != command.get("id"):
+            return None
+
+        if command.get("status") in PENDING_STATES:
+            self._pending[key] = command
+            return None
+
+        self.forget(key)
+        queued, started, ended = (self._timestamp(command.get(field)) for field in ("queued", "started", "ended"))
+        finished = {
+            "name": command.get("name") or command.get("commandName") or "unknown",
+            "status": command.get("status"),
+            "queue_seconds": round(started - queued, 1) if queued and started else None,
+            "run_seconds": round(ended - started, 1) if started and ended else None,
+        }
+
+        stats = self._finished.setdefault(finished["name"], {"count": 0, "queue_seconds": 0.0, "run_seconds": 0.0})
+        stats["count"] += 1
+        stats["queue_seconds"] += finished["queue_seconds"] or 0
+        stats["run_seconds"] += finished["run_seconds"] or 0
+        return finished
+
+    @staticmethod
+    def _timestamp(value) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+
+    def stats(self) -> dict:
+        """ Pending/skipped counts and the average queue/run seconds per command name """
+        return {
+            "pending": len(self._pending),
+            "skipped": self.skipped,
+            "finished": {
+                name: {"count": s["count"], "avg_queue_seconds": round(s["queue_seconds"] / s["count"], 1), "avg_run_seconds": round(s["run_seconds"] / s["count"], 1)}
+                for name, s in self._finished.items()
+            },
+        }
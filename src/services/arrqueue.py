@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+
+# One queue view per backend (movie/serie) for the whole process
+_queues: dict[str, "QueueStatus"] = {}
+
+# Records per /queue page
+PAGE_SIZE = 250
+
+
+def get_queue_status(media_handler) -> "QueueStatus":
+    """ Returns the process-wide download queue view for the backend of media_handler """
+
+    if media_handler.label not in _queues:
+        _queues[media_handler.label] = QueueStatus(media_handler)
+
+    return _queues[media_handler.label]
+
+
+class QueueStatus:
+    """
+    Cached view of the Radarr/Sonarr /queue endpoint.
+
+    The queue is fetched page by page and indexed by movieId (Radarr) or
+    seriesId (Sonarr), so "is this film/serie downloading" is a dict
+    lookup on the id Radarr/Sonarr already gave the media. The view is kept
+    for ARR_QUEUE_TTL seconds; concurrent requests share one refresh. If the
+    queue can't be fetched the previous view is used until it is three
+    TTLs (at least 90 seconds) old, after that nothing counts as downloading.
+    """
+
+    def __init__(self, media_handler):
+
+        # Set default values
+        self.media_handler = media_handler
+        self.id_field = "movieId" if media_handler.label == "movie" else "seriesId"
+        self.ttl = self._ttl()
+        self.refreshed_at: Optional[float] = None
+        self._by_media: dict[int, dict] = {}
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _ttl() -> int:
+        try:
+            return max(0, int(os.getenv("ARR_QUEUE_TTL", "30")))
+        except ValueError:
+            return 30
+
+    def _age(self) -> float:
+        return float("inf") if self.refreshed_at is None else time.monotonic() - self.refreshed_at
+
+    async def refresh(self) -> bool:
+        """ Fetches every page of /queue and rebuilds the index """
+
+        records = []
+        page = 1
+        while True:
+            response = await self.media_handler.get(f"/queue?page={page}&pageSize={PAGE_SIZE}&includeUnknownMovieItems=false&includeUnknownSeriesItems=false")
+            if not isinstance(response, dict):
+                return False
+
+            page_records = response.get("records") or []
+            records.extend(page_records)
+            if not page_records or len(records) >= int(response.get("totalRecords") or 0):
+                break
+            page += 1
+
+        by_media = {}
+        for record in records:
+            media_id = record.get(self.id_field)
+            if media_id is not None:
+                by_media.setdefault(media_id, []).append(record)
+
+        self._by_media = {media_id: self._summarize(items) for media_id, items in by_media.items()}
+        self.refreshed_at = time.monotonic()
+        return True
+
+    @staticmethod
+    def _summarize(records: list[dict]) -> dict:
+        """ Combines the queue records of one film/serie (a serie has one per episode or season pack) """
+
+        size = sum(record.get("size") or 0 for record in records)
+        size_left = sum(record.get("sizeleft") or 0 for record in records)
+        progress = round(100 * (size - size_left) / size) if size else 0
+
+        # The whole film/serie is done when its slowest download is
+        completions = [record["estimatedCompletionTime"] for record in records if record.get("estimatedCompletionTime")]
+
+        return {
+            "records": len(records),
+            "progress": progress,
+            "estimated_completion": max(completions) if completions else None,
+            "status": {record.get("status") for record in records},
+        }
+
+    async def snapshot(self) -> dict[int, dict]:
+        """ Returns {movieId/seriesId: summary} for everything in the queue, refreshed when older than the TTL """
+
+        if self._age() > self.ttl:
+            async with self._lock:
+                if self._age() > self.ttl:
+                    await self.refresh()
+
+        return self._by_media if self._age() <= max(3 * self.ttl, 90) else {}
+
+    def describe(self, media_id) -> str:
+        """ Dutch progress text for the "downloading" message, empty if unknown """
+
+        summary = self._by_media.get(media_id)
+        if not summary or not summary["progress"]:
+            return ""
+
+        text = f" ({summary['progress']}%"
+        eta = summary["estimated_completion"]
+        if eta:
+            minutes = self._minutes_until(eta)
+            if minutes is not None and minutes > 0:
+                text += f", nog ongeveer {minutes} minuten" if minutes < 120 else f", nog ongeveer {round(minutes / 60)} uur"
+        return text + ")"
+
+    @staticmethod
+    def _minutes_until(timestamp: str) -> Optional[int]:
+        try:
+            moment = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return round((moment - datetime.now(timezone.utc)).total_seconds() / 60)
@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+
+import os
+import random
+import time
+from typing import Optional
+
+
+# One breaker per backend (movie/serie) for the whole process
+_breakers: dict[str, "CircuitBreaker"] = {}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+def get_breaker(label: str) -> "CircuitBreaker":
+    """ Returns the process-wide circuit breaker of a backend, tuned by ARR_BREAKER_* in dot-env """
+
+    if label not in _breakers:
+        _breakers[label] = CircuitBreaker(
+            label,
+            failure_threshold=max(1, int(_env_number("ARR_BREAKER_THRESHOLD", 5))),
+            cooldown=_env_number("ARR_BREAKER_COOLDOWN", 60),
+        )
+
+    return _breakers[label]
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 10.0) -> float:
+    """ Exponential backoff with full jitter: random between 0 and min(cap, base * 2^(attempt - 1)) """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker for one Radarr/Sonarr backend.
+
+    After failure_threshold failed calls in a row the breaker opens and
+    every call fails fast for cooldown seconds. Then one trial call is let
+    through (half-open): success closes the breaker, failure opens it again.
+    The trial call releases its claim when it ends without either, so a
+    cancelled trial doesn't keep the breaker half-open forever.
+    Answers with a 4xx still count as success, the backend is reachable.
+    """
+
+    def __init__(self, label: str, failure_threshold: int = 5, cooldown: float = 60):
+
+        # Set default values
+        self.label = label
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    def is_available(self) -> bool:
+        """ True if a call would currently be let through, without claiming the half-open trial """
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at >= self.cooldown
+        if self.state == HALF_OPEN:
+            return not self._trial_running
+        return True
+
+    def allow(self) -> bool:
+        """ Claims permission for one call """
+
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.state = HALF_OPEN
+            self._trial_running = False
+
+        if self.state == HALF_OPEN:
+            if self._trial_running:
+                return False
+            self._trial_running = True
+
+        return True
+
+    def release(self) -> None:
+        """ Gives back the half-open trial of a call that ended without an outcome, e.g. a cancelled one """
+        if self.state == HALF_OPEN:
+            self._trial_running = False
+
+    def record_success(self) -> Optional[str]:
+        """ Returns the previous state if this call closed the breaker """
+
+        previous = self.state
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_running = False
+        return previous if previous != CLOSED else None
+
+    def record_failure(self) -> bool:
+        """ Returns True if this failure opened the breaker """
+
+        self.failures += 1
+        self._trial_running = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            was_open = self.state == OPEN
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            return not was_open
+        return False
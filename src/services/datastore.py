@@ -0,0 +1,467 @@
+#!/usr/bin/python3
+
+import contextlib
+import json
+import os
+import sqlite3
+import time
+import traceback
+from pathlib import Path
+from typing import Optional, Union
+
+from src.services.jsonstore import JsonDataStore
+from src.services.shardstore import ShardedDataStore
+from src.services.mutations import MutationQueue
+from src.services.passwords import PasswordIndex
+
+
+# One store per data file for the whole process. Start, Media, Schedule,
+# Subscribe and Message are instantiated more than once (Media builds its own
+# Start, Subscribe its own Schedule), so they must all share the same handle.
+_stores: dict[str, Union["DataStore", JsonDataStore]] = {}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_password ON users (password);
+CREATE TABLE IF NOT EXISTS user_ids (
+    user_id TEXT PRIMARY KEY,
+    display TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocked_users (
+    user_id TEXT PRIMARY KEY,
+    first_name TEXT
+);
+CREATE TABLE IF NOT EXISTS update_messages (
+    user_id TEXT PRIMARY KEY,
+    subscribed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notify_list (
+    user_id TEXT NOT NULL,
+    media_type TEXT NOT NULL,
+    tmdb_id TEXT NOT NULL,
+    added_at INTEGER,
+    PRIMARY KEY (user_id, media_type, tmdb_id)
+);
+CREATE INDEX IF NOT EXISTS notify_list_tmdb ON notify_list (media_type, tmdb_id);
+CREATE TABLE IF NOT EXISTS serie_episode (
+    user_id TEXT NOT NULL,
+    tmdb_id TEXT NOT NULL,
+    started INTEGER NOT NULL DEFAULT 0,
+    last TEXT NOT NULL DEFAULT 'S00E00',
+    PRIMARY KEY (user_id, tmdb_id)
+);
+CREATE INDEX IF NOT EXISTS serie_episode_tmdb ON serie_episode (tmdb_id);
+CREATE TABLE IF NOT EXISTS recurring_serie (
+    user_id TEXT NOT NULL,
+    tmdb_id TEXT NOT NULL,
+    last_notified_season INTEGER NOT NULL DEFAULT 0,
+    last_seen_season INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, tmdb_id)
+);
+CREATE INDEX IF NOT EXISTS recurring_serie_tmdb ON recurring_serie (tmdb_id);
+"""
+
+
+def get_data_store(args, logger) -> Union["DataStore", JsonDataStore]:
+    """
+    Returns the process-wide data store for the live/dev environment.
+
+    DATA_BACKEND=sqlite (default) uses data.db, DATA_BACKEND=json keeps
+    data.json as the on-disk format behind an in-memory cache and
+    DATA_BACKEND=sharded splits it into one file per user (data.shards).
+    The backend is never picked implicitly, both failover hosts must set
+    the same value.
+    """
+
+    db_path = "data.db" if args.env == "live" else "data.dev.db"
+    json_path = "data.json" if args.env == "live" else "data.dev.json"
+    shard_dir = "data.shards" if args.env == "live" else "data.dev.shards"
+    backend = (os.getenv("DATA_BACKEND") or "sqlite").strip().lower()
+    if backend not in ("sqlite", "json", "sharded"):
+        raise EnvironmentError(f"Invalid DATA_BACKEND '{backend}', use sqlite, json or sharded")
+
+    if backend in ("json", "sharded"):
+        store_key = json_path if backend == "json" else shard_dir
+        if store_key not in _stores:
+            try:
+                flush_interval = max(0.1, float(os.getenv("DATA_FLUSH_INTERVAL", "5")))
+            except ValueError:
+                flush_interval = 5.0
+            if backend == "json":
+                _stores[store_key] = JsonDataStore(logger, json_path, flush_interval)
+            else:
+                _stores[store_key] = ShardedDataStore(logger, shard_dir, json_path, flush_interval)
+            logger.log_to_file(f"Data store: DATA_BACKEND={backend} ({store_key})", "info")
+        return _stores[store_key]
+
+    if db_path not in _stores:
+        _stores[db_path] = DataStore(logger, db_path, json_path)
+        logger.log_to_file(f"Data store: DATA_BACKEND=sqlite ({db_path})", "info")
+
+    return _stores[db_path]
+
+
+class DataStore(MutationQueue):
+    """
+    SQLite backed replacement for the data.json read-modify-write cycle.
+
+    Every handler used to load and rewrite the complete data.json. The store
+    keeps the same information in indexed tables (WAL mode) so a button press
+    only touches the rows it needs. On first open the existing data.json is
+    imported once. Writes go through the MutationQueue writer task, which
+    commits each batch of queued operations in one transaction.
+    """
+
+    def __init__(self, logger, db_path: str, json_path: str):
+
+        # Set default values
+        super().__init__(logger)
+        self.db_path = db_path
+        self.json_path = json_path
+
+        # Open the database, WAL keeps readers from blocking on the writer
+        self._db = self._connect()
+
+        # Import data.json the first time the database is created
+        self._import_json()
+        self._warn_stale_import()
+
+        # Access-control snapshot, reloaded when the database changed (see _revalidate)
+        self._access_version: Optional[int] = None
+        self._file_signature = self._stat_signature()
+        self._user_names: dict[str, str] = {}
+        self._blocked: set[str] = set()
+        self._passwords = PasswordIndex()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA busy_timeout=5000")
+        db.executescript(_SCHEMA)
+        return db
+
+    def _stat_signature(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.db_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _import_json(self) -> None:
+        """ One-shot import of the legacy data.json format """
+
+        # Only import once
+        if self._db.execute("SELECT 1 FROM meta WHERE key = 'imported_json'").fetchone():
+            return
+
+        if not Path(self.json_path).is_file():
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('imported_json', ?)", (str(round(time.time())),))
+            return
+
+        try:
+            with open(self.json_path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            # Leave the marker unset so the import is retried on the next start
+            self.log.log_to_file(f"Could not import {self.json_path} into {self.db_path}. Error: {e} - Traceback: {traceback.format_exc()}", "error")
+            return
+
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO users (name, password) VALUES (?, ?)",
+                [(str(k), str(v)) for k, v in data.get("users", {}).items()])
+            self._db.executemany(
+                "INSERT OR REPLACE INTO user_ids (user_id, display) VALUES (?, ?)",
+                [(str(k), str(v)) for k, v in data.get("user_id", {}).items()])
+            self._db.executemany(
+                "INSERT OR REPLACE INTO blocked_users (user_id, first_name) VALUES (?, ?)",
+                [(str(k), str(v)) for k, v in data.get("blocked_users", {}).items()])
+
+            subs = data.get("update_messages", {})
+            if isinstance(subs, dict):
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO update_messages (user_id, subscribed) VALUES (?, ?)",
+                    [(str(k), int(v is True)) for k, v in subs.items()])
+
+            for user_id, media_types in data.get("notify_list", {}).items():
+                for media_type in ("serie", "film"):
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO notify_list (user_id, media_type, tmdb_id, added_at) VALUES (?, ?, ?, ?)",
+                        [(str(user_id), media_type, str(k), v) for k, v in media_types.get(media_type, {}).items()])
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO serie_episode (user_id, tmdb_id, started, last) VALUES (?, ?, ?, ?)",
+                    [(str(user_id), str(k), int(bool((v or {}).get("started", False))), (v or {}).get("last", "S00E00"))
+                     for k, v in media_types.get("serie_episode", {}).items()])
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO recurring_serie (user_id, tmdb_id, last_notified_season, last_seen_season) VALUES (?, ?, ?, ?)",
+                    [(str(user_id), str(k), int((v or {}).get("last_notified_season", 0)), int((v or {}).get("last_seen_season", 0)))
+                     for k, v in media_types.get("recurring_serie", {}).items()])
+
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('imported_json', ?)", (str(round(time.time())),))
+
+        self.log.log_to_file(f"Imported {self.json_path} into {self.db_path}", "info")
+
+    def _warn_stale_import(self) -> None:
+        """ Warns when data.json changed after it was imported, e.g. replicated by a host running DATA_BACKEND=json """
+
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'imported_json'").fetchone()
+        try:
+            changed = row is not None and os.path.getmtime(self.json_path) > int(row[0])
+        except (OSError, ValueError):
+            return
+
+        if changed:
+            self.log.log_to_file(f"{self.json_path} changed after it was imported into {self.db_path} and is no longer read. "
+                                 f"Set DATA_BACKEND=json if {self.json_path} is the replicated data store.", "warning")
+
+    async def flush(self) -> None:
+        """ Waits for queued changes, every batch is committed as it is applied """
+        await self.drain()
+
+    @contextlib.contextmanager
+    def _batch_context(self):
+        # One transaction per batch of queued operations
+        self._db.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._db.rollback()
+            raise
+        self._db.commit()
+
+        # A checkpoint of our own commit changes the mtime, that is no reason to reopen
+        self._file_signature = self._stat_signature()
+
+    @contextlib.contextmanager
+    def _op_context(self):
+        # A failing operation is rolled back to its savepoint, the rest of the batch is still committed
+        self._db.execute("SAVEPOINT op")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK TO op")
+            raise
+        finally:
+            self._db.execute("RELEASE op")
+
+    # Users and access control
+
+    def _revalidate(self) -> None:
+        """
+        Reloads the access-control snapshot when the database changed.
+        PRAGMA data_version changes on commits from other connections (e.g. the
+        sqlite3 CLI); our own writes reset _access_version instead. A database
+        file that was replaced (e.g. restored from a backup) doesn't change
+        data_version, so a new inode or mtime reopens the connection.
+        """
+
+        signature = self._stat_signature()
+        if signature is not None and signature != self._file_signature:
+            # Empty our WAL first, its frames belong to the old file and would be replayed onto the new one
+            try:
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                pass
+            self._db.close()
+            self._db = self._connect()
+            self._file_signature = signature
+            self._access_version = None
+            self.log.log_to_file(f"{self.db_path} changed on disk, reopened the database", "info")
+
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._access_version:
+            return
+
+        self._user_names = dict(self._db.execute("SELECT user_id, display FROM user_ids"))
+        self._blocked = {row[0] for row in self._db.execute("SELECT user_id FROM blocked_users")}
+        self._passwords.rebuild(self._db.execute("SELECT name, password FROM users ORDER BY rowid"))
+        self._access_version = version
+
+    async def get_user(self, user_id: str) -> Optional[str]:
+        """ Returns the 'gebruiker, first_name' string of a verified user """
+        self._revalidate()
+        return self._user_names.get(str(user_id))
+
+    async def user_ids(self) -> list[str]:
+        """ Returns all verified Telegram user ID's """
+        self._revalidate()
+        return list(self._user_names)
+
+    async def is_blocked(self, user_id: str) -> bool:
+        self._revalidate()
+        return str(user_id) in self._blocked
+
+    async def find_user_by_password(self, password: str) -> Optional[str]:
+        """ Returns the user name the password belongs to """
+        self._revalidate()
+        return self._passwords.lookup(password)
+
+    async def register_user(self, user_id: str, name: str, first_name: str) -> None:
+        """ Marks a Telegram user as verified, subscribed to general updates by default """
+        await self._submit(self._register_user, str(user_id), name, first_name)
+
+    def _register_user(self, user_id: str, name: str, first_name: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO user_ids (user_id, display) VALUES (?, ?)", (user_id, f"{name}, {first_name}"))
+        self._db.execute("INSERT OR REPLACE INTO update_messages (user_id, subscribed) VALUES (?, 1)", (user_id,))
+        self._access_version = None
+
+    async def block_user(self, user_id: str, first_name: str) -> None:
+        await self._submit(self._block_user, str(user_id), first_name)
+
+    def _block_user(self, user_id: str, first_name: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO blocked_users (user_id, first_name) VALUES (?, ?)", (user_id, first_name))
+        self._access_version = None
+
+    # General update messages
+
+    async def is_update_subscribed(self, user_id: str) -> bool:
+        """ Default: subscribed unless explicitly turned off """
+        return self._is_update_subscribed(str(user_id))
+
+    def _is_update_subscribed(self, user_id: str) -> bool:
+        row = self._db.execute("SELECT subscribed FROM update_messages WHERE user_id = ?", (user_id,)).fetchone()
+        return True if row is None else bool(row[0])
+
+    async def set_update_subscription(self, user_id: str, subscribed: bool) -> bool:
+        """ Sets the general update subscription and returns the previous value """
+        return await self._submit(self._set_update_subscription, str(user_id), subscribed)
+
+    def _set_update_subscription(self, user_id: str, subscribed: bool) -> bool:
+        was_subscribed = self._is_update_subscribed(user_id)
+        self._db.execute("INSERT OR REPLACE INTO update_messages (user_id, subscribed) VALUES (?, ?)", (user_id, int(subscribed)))
+        return was_subscribed
+
+    # Notify list
+
+    async def notify_list(self) -> dict:
+        """
+        Returns the notify list in the data.json shape:
+        {user_id: {"serie": {}, "film": {}, "recurring_serie": {}, "serie_episode": {}}}
+        """
+        notify = {}
+
+        def user_node(user_id: str) -> dict:
+            return notify.setdefault(user_id, {"serie": {}, "film": {}, "recurring_serie": {}, "serie_episode": {}})
+
+        for user_id, media_type, tmdb_id, added_at in self._db.execute("SELECT user_id, media_type, tmdb_id, added_at FROM notify_list"):
+            user_node(user_id)[media_type][tmdb_id] = added_at
+        for user_id, tmdb_id, last_notified, last_seen in self._db.execute("SELECT user_id, tmdb_id, last_notified_season, last_seen_season FROM recurring_serie"):
+            user_node(user_id)["recurring_serie"][tmdb_id] = {"last_notified_season": last_notified, "last_seen_season": last_seen}
+        for user_id, tmdb_id, started, last in self._db.execute("SELECT user_id, tmdb_id, started, last FROM serie_episode"):
+            user_node(user_id)["serie_episode"][tmdb_id] = {"started": bool(started), "last": last}
+
+        return notify
+
+    async def notify_index(self) -> dict:
+        """
+        Returns the notify list grouped by media instead of by user:
+        {"serie": {tmdb_id: {user_id: added_at}}, "film": {...}, "recurring_serie": {tmdb_id: {user_id: state}}, "serie_episode": {...}}
+        Served from the tmdb_id indexes on each table.
+        """
+        index = {"serie": {}, "film": {}, "recurring_serie": {}, "serie_episode": {}}
+
+        for user_id, media_type, tmdb_id, added_at in self._db.execute("SELECT user_id, media_type, tmdb_id, added_at FROM notify_list ORDER BY media_type, tmdb_id"):
+            index[media_type].setdefault(tmdb_id, {})[user_id] = added_at
+        for user_id, tmdb_id, last_notified, last_seen in self._db.execute("SELECT user_id, tmdb_id, last_notified_season, last_seen_season FROM recurring_serie ORDER BY tmdb_id"):
+            index["recurring_serie"].setdefault(tmdb_id, {})[user_id] = {"last_notified_season": last_notified, "last_seen_season": last_seen}
+        for user_id, tmdb_id, started, last in self._db.execute("SELECT user_id, tmdb_id, started, last FROM serie_episode ORDER BY tmdb_id"):
+            index["serie_episode"].setdefault(tmdb_id, {})[user_id] = {"started": bool(started), "last": last}
+
+        return index
+
+    async def media_subscribers(self, tmdb_id: str) -> dict:
+        """
+        Returns the notify_index entries of one film/serie:
+        {"serie": {user_id: added_at}, "film": {...}, "recurring_serie": {user_id: state}, "serie_episode": {...}}
+        """
+        tmdb_id = str(tmdb_id)
+        subscribers = {"serie": {}, "film": {}, "recurring_serie": {}, "serie_episode": {}}
+
+        for user_id, media_type, added_at in self._db.execute("SELECT user_id, media_type, added_at FROM notify_list WHERE tmdb_id = ?", (tmdb_id,)):
+            subscribers[media_type][user_id] = added_at
+        for user_id, last_notified, last_seen in self._db.execute("SELECT user_id, last_notified_season, last_seen_season FROM recurring_serie WHERE tmdb_id = ?", (tmdb_id,)):
+            subscribers["recurring_serie"][user_id] = {"last_notified_season": last_notified, "last_seen_season": last_seen}
+        for user_id, started, last in self._db.execute("SELECT user_id, started, last FROM serie_episode WHERE tmdb_id = ?", (tmdb_id,)):
+            subscribers["serie_episode"][user_id] = {"started": bool(started), "last": last}
+
+        return subscribers
+
+    async def add_notify(self, user_id: str, media_type: str, tmdb_id: str, added_at: Optional[int] = None) -> None:
+        """ Adds (or overwrites) a film/serie the user wants to be notified about """
+        added_at = round(time.time()) if added_at is None else added_at
+        await self._submit(self._add_notify, str(user_id), media_type, str(tmdb_id), added_at)
+
+    def _add_notify(self, user_id: str, media_type: str, tmdb_id: str, added_at: int) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO notify_list (user_id, media_type, tmdb_id, added_at) VALUES (?, ?, ?, ?)",
+            (user_id, media_type, tmdb_id, added_at))
+
+    async def remove_notify(self, user_id: str, media_type: str, tmdb_id: str) -> None:
+        await self._submit(self._remove_notify, str(user_id), media_type, str(tmdb_id))
+
+    def _remove_notify(self, user_id: str, media_type: str, tmdb_id: str) -> None:
+        self._db.execute(
+            "DELETE FROM notify_list WHERE user_id = ? AND media_type = ? AND tmdb_id = ?",
+            (user_id, media_type, tmdb_id))
+
+    # Serie episode / recurring season tracking
+
+    async def episode_subscriptions(self, user_id: str) -> dict:
+        """ Returns {tmdb_id: {"started": bool, "last": "SxxExx"}} for one user """
+        rows = self._db.execute("SELECT tmdb_id, started, last FROM serie_episode WHERE user_id = ?", (str(user_id),))
+        return {tmdb_id: {"started": bool(started), "last": last} for tmdb_id, started, last in rows}
+
+    async def set_episode_state(self, user_id: str, tmdb_id: str, started: bool, last: str) -> None:
+        await self._submit(self._set_episode_state, str(user_id), str(tmdb_id), started, last)
+
+    def _set_episode_state(self, user_id: str, tmdb_id: str, started: bool, last: str) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO serie_episode (user_id, tmdb_id, started, last) VALUES (?, ?, ?, ?)",
+            (user_id, tmdb_id, int(started), last))
+
+    async def update_episode_last(self, user_id: str, tmdb_id: str, last: str) -> None:
+        """ Only updates existing entries, an unsubscribe in the meantime is not undone """
+        await self._submit(self._update_episode_last, str(user_id), str(tmdb_id), last)
+
+    def _update_episode_last(self, user_id: str, tmdb_id: str, last: str) -> None:
+        self._db.execute(
+            "UPDATE serie_episode SET last = ? WHERE user_id = ? AND tmdb_id = ?",
+            (last, user_id, tmdb_id))
+
+    async def remove_episode_state(self, user_id: str, tmdb_id: str) -> None:
+        await self._submit(self._remove_episode_state, str(user_id), str(tmdb_id))
+
+    def _remove_episode_state(self, user_id: str, tmdb_id: str) -> None:
+        self._db.execute("DELETE FROM serie_episode WHERE user_id = ? AND tmdb_id = ?", (user_id, tmdb_id))
+
+    async def set_recurring_state(self, user_id: str, tmdb_id: str, last_notified_season: Optional[int] = None, last_seen_season: Optional[int] = None) -> None:
+        """ Creates or updates the recurring season state, None keeps the current value """
+        await self._submit(self._set_recurring_state, str(user_id), str(tmdb_id), last_notified_season, last_seen_season)
+
+    def _set_recurring_state(self, user_id: str, tmdb_id: str, last_notified_season: Optional[int], last_seen_season: Optional[int]) -> None:
+        self._db.execute(
+            "INSERT OR IGNORE INTO recurring_serie (user_id, tmdb_id) VALUES (?, ?)",
+            (user_id, tmdb_id))
+        if last_notified_season is not None:
+            self._db.execute(
+                "UPDATE recurring_serie SET last_notified_season = ? WHERE user_id = ? AND tmdb_id = ?",
+                (int(last_notified_season), user_id, tmdb_id))
+        if last_seen_season is not None:
+            self._db.execute(
+                "UPDATE recurring_serie SET last_seen_season = ? WHERE user_id = ? AND tmdb_id = ?",
+                (int(last_seen_season), user_id, tmdb_id))
+
+    async def remove_recurring_state(self, user_id: str, tmdb_id: str) -> None:
+        await self._submit(self._remove_recurring_state, str(user_id), str(tmdb_id))
+
+    def _remove_recurring_state(self, user_id: str, tmdb_id: str) -> None:
+        self._db.execute("DELETE FROM recurring_serie WHERE user_id = ? AND tmdb_id = ?", (user_id, tmdb_id))
@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+
+import asyncio
+import os
+import time
+from typing import Optional
+
+from src.services.limiter import BACKGROUND
+
+
+# One service per backend (movie/serie) for the whole process
+_services: dict[str, "DiskSpaceService"] = {}
+
+# Minimum free space on the mount of a folder before a download goes there
+MIN_FREE_BYTES = 150 * 1024 ** 3
+
+
+def get_disk_space_service(media_handler, media_folders: str) -> "DiskSpaceService":
+    """ Returns the process-wide disk-space service for the backend of media_handler """
+
+    if media_handler.label not in _services:
+        _services[media_handler.label] = DiskSpaceService(media_handler, media_folders)
+
+    return _services[media_handler.label]
+
+
+class DiskSpaceService:
+    """
+    Cached view of the Radarr/Sonarr /diskspace endpoint.
+
+    refresh() runs as a repeating job (ARR_DISKSPACE_REFRESH seconds) and
+    after every queued download. The mapping of each configured folder
+    (MOVIE_FOLDERS/SERIE_FOLDERS) to its most specific mount is only
+    recomputed when the set of mounts changes, so pick_folder() is a few
+    dict lookups. Without fresh data pick_folder() refreshes inline first.
+
+    Only that inline refresh has a user waiting for it; the job and the
+    refresh after a download go through a BACKGROUND copy of the handler,
+    so they don't take the limiter slots of user requests.
+    """
+
+    def __init__(self, media_handler, media_folders: str):
+
+        # Set default values
+        self.media_handler = media_handler
+        self.background_handler = type(media_handler)(media_handler.log, BACKGROUND)
+        self.folders = [os.path.normpath(p.strip()) for p in (media_folders or "").split(",") if p.strip()]
+        self.refresh_interval = self._refresh_interval()
+        self.refreshed_at: Optional[float] = None
+        self._free_by_mount: dict[str, int] = {}
+        self._mount_by_folder: dict[str, Optional[str]] = {}
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _refresh_interval() -> int:
+        try:
+            return max(30, int(os.getenv("ARR_DISKSPACE_REFRESH", "300")))
+        except ValueError:
+            return 300
+
+    @property
+    def fresh(self) -> bool:
+        return self.refreshed_at is not None and time.monotonic() - self.refreshed_at <= 3 * self.refresh_interval
+
+    async def refresh(self, context=None, interactive: bool = False) -> bool:
+        """ Fetches /diskspace and updates the cached view, used as job_queue callback """
+
+        async with self._lock:
+            media_handler = self.media_handler if interactive else self.background_handler
+            disk_space = await media_handler.get_disk_space()
+            if not disk_space:
+                return False
+
+            free_by_mount = {os.path.normpath(d["path"]): d.get("freeSpace", 0) for d in disk_space if d.get("path")}
+            if free_by_mount.keys() != self._free_by_mount.keys():
+                self._mount_by_folder = {folder: self._best_mount(folder, free_by_mount) for folder in self.folders}
+
+            self._free_by_mount = free_by_mount
+            self.refreshed_at = time.monotonic()
+            return True
+
+    @staticmethod
+    def _best_mount(folder: str, mounts) -> Optional[str]:
+        """ Most specific mount the folder lives on """
+        candidates = [mount for mount in mounts if folder == mount or folder.startswith(mount.rstrip(os.sep) + os.sep)]
+        return max(candidates, key=len) if candidates else None
+
+    async def pick_folder(self, min_free: int = MIN_FREE_BYTES) -> Optional[str]:
+        """ Returns the first configured folder whose mount has more than min_free bytes free """
+
+        if not self.fresh and not await self.refresh(interactive=True):
+            return None
+
+        for folder in self.folders:
+            mount = self._mount_by_folder.get(folder)
+            if mount is not None and self._free_by_mount.get(mount, 0) > min_free:
+                return folder
+
+        return None
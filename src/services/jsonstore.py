@@ -0,0 +1,400 @@
+#!/usr/bin/python3
+
+import asyncio
+import copy
+import json
+import os
+import tempfile
+import time
+import traceback
+from pathlib import Path
+from typing import Optional
+
+from src.services.mutations import MutationQueue
+from src.services.passwords import PasswordIndex
+
+
+NOTIFY_KINDS = ("serie", "film", "recurring_serie", "serie_episode")
+
+# Top-level maps that are reloaded when data.json is changed outside the bot
+ACCESS_KEYS = ("users", "user_id", "blocked_users")
+
+
+class JsonDataStore(MutationQueue):
+    """
+    data.json backed data store with an in-memory cache.
+
+    Used when the JSON format has to be kept (e.g. for Syncthing). Reads are
+    served from memory; mutations only mark the cache dirty and are written
+    out together once per flush interval. Every write goes to a temp file
+    that is fsynced and then moved over data.json with os.replace, so a
+    half-written file is never visible to other processes.
+
+    Access control (users, user_id, blocked_users) is revalidated against the
+    file's mtime/inode/size on every check, so a block or password edited by
+    hand or replicated by Syncthing takes effect without a restart.
+
+    Mutations are applied by the MutationQueue writer task, one batch at a
+    time, against the cached dict.
+    """
+
+    def __init__(self, logger, json_path: str, flush_interval: float = 5.0):
+
+        # Set default values
+        super().__init__(logger)
+        self.json_path = json_path
+        self.flush_interval = flush_interval
+        self._dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+
+        # Load the file once, from here on the cache is the source of truth
+        self._data = self._read_file()
+        self._index = self._build_index()
+        self._passwords = PasswordIndex()
+        self._passwords.rebuild(self._data["users"].items())
+
+        # Access-control changes made since the last flush, kept when data.json is reloaded
+        self._signature = self._stat_signature()
+        self._unflushed_access = {key: {} for key in ACCESS_KEYS}
+
+    def _read_file(self, path: Optional[str] = None) -> dict:
+        """ Reads data.json from disk and makes sure all top-level keys exist """
+
+        try:
+            with open(path or self.json_path, "r") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            data = {}
+
+        for key in ("users", "user_id", "blocked_users", "notify_list", "update_messages"):
+            if not isinstance(data.get(key), dict):
+                data[key] = {}
+
+        return data
+
+    def _stat_signature(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.json_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    def _revalidate(self) -> None:
+        """ Reloads the access-control maps when data.json was replaced or edited by someone else """
+
+        # Our own write is in progress, its signature is recorded when it is done
+        if self._write_lock.locked():
+            return
+
+        self._merge_access()
+
+    def _merge_access(self) -> bool:
+        """
+        Merges the access-control maps on disk into the cache if the file changed,
+        changes that were not flushed yet win. Returns False if the file can't be read.
+        """
+
+        signature = self._stat_signature()
+        if signature is None or signature == self._signature:
+            return True
+
+        try:
+            data = self._read_access()
+        except ValueError:
+            # Half-written by an editor, try again on the next check
+            return False
+
+        for key in ACCESS_KEYS:
+            self._data[key] = {**data[key], **self._unflushed_access[key]}
+        self._passwords.rebuild(self._data["users"].items())
+        self._signature = signature
+        self.log.log_to_file(f"{self.json_path} changed on disk, reloaded users and blocked users", "info")
+        return True
+
+    def _read_access(self) -> dict:
+        """ Reads the file holding the access-control maps """
+        return self._read_file()
+
+    def _build_index(self) -> dict:
+        """
+        Builds the reverse index next to notify_list: {kind: {tmdb_id: {user_id: state}}}.
+        The recurring_serie/serie_episode states are the same dicts as in notify_list.
+        """
+
+        index = {kind: {} for kind in NOTIFY_KINDS}
+        for user_id, node in self._data["notify_list"].items():
+            for kind in NOTIFY_KINDS:
+                for tmdb_id, state in (node or {}).get(kind, {}).items():
+                    index[kind].setdefault(str(tmdb_id), {})[str(user_id)] = state
+        return index
+
+    def _index_set(self, kind: str, tmdb_id: str, user_id: str, state) -> None:
+        self._index[kind].setdefault(tmdb_id, {})[user_id] = state
+
+    def _index_remove(self, kind: str, tmdb_id: str, user_id: str) -> None:
+        subscribers = self._index[kind].get(tmdb_id)
+        if subscribers is None:
+            return
+        subscribers.pop(user_id, None)
+        if not subscribers:
+            del self._index[kind][tmdb_id]
+
+    def _write_file(self, path: str, payload: str) -> None:
+        """ Atomically replaces a file: temp file + fsync + os.replace """
+
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f".{Path(path).name}.", suffix=".tmp")
+        try:
+            # Keep the permissions of the file being replaced (mkstemp creates 0600)
+            try:
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+            except FileNotFoundError:
+                os.chmod(tmp_path, 0o644)
+
+            with os.fdopen(fd, "w") as file:
+                file.write(payload)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        # Make the rename itself durable
+        try:
+            dir_fd = os.open(folder, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+
+    def _write_files(self, payloads: dict[str, str]) -> Optional[tuple]:
+        """ Writes every payload, returns the new signature of the access-control file """
+        for path, payload in payloads.items():
+            self._write_file(path, payload)
+        return self._stat_signature()
+
+    def _payloads(self) -> dict[str, str]:
+        """ Serializes everything that has to be written: {path: content} """
+        return {self.json_path: json.dumps(self._data, indent=4)}
+
+    def _payloads_failed(self, payloads: dict[str, str]) -> None:
+        """ Called when writing the payloads failed, so they are written again next flush """
+        pass
+
+    def _after_batch(self) -> None:
+        self._mark_dirty()
+
+    def _mark_dirty(self) -> None:
+        """ Schedules a single debounced flush for all mutations in this interval """
+
+        self._dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """ Writes the cache to disk if anything changed since the last flush """
+
+        # Apply everything that is still queued first
+        await self.drain()
+
+        async with self._write_lock:
+            if not self._dirty:
+                return
+
+            # Don't overwrite a user or password that was added by hand or on the other Syncthing node
+            if not self._merge_access():
+                await self.log.logger(f"{self.json_path} can't be read, postponing the flush", False, "warning", False)
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+                return
+
+            # Serialize on the event loop so no handler mutates the dict halfway
+            payloads = self._payloads()
+            self._dirty = False
+            unflushed_access = self._unflushed_access
+            self._unflushed_access = {key: {} for key in ACCESS_KEYS}
+
+            try:
+                self._signature = await asyncio.to_thread(self._write_files, payloads)
+            except Exception as e:
+                self._dirty = True
+                self._payloads_failed(payloads)
+                for key in ACCESS_KEYS:
+                    self._unflushed_access[key] = {**unflushed_access[key], **self._unflushed_access[key]}
+                await self.log.logger(f"❌ *Error while writing {self.json_path}.*\nCheck the error log for more information. ❌", False, "error")
+                await self.log.logger(f"Error: {' '.join(map(str, e.args))} - Traceback: {traceback.format_exc()}", False, "error", False)
+
+    def _user_node(self, user_id: str) -> dict:
+        node = self._data["notify_list"].setdefault(str(user_id), {})
+        for media_type in NOTIFY_KINDS:
+            node.setdefault(media_type, {})
+        return node
+
+    def _existing_state(self, user_id: str, kind: str) -> Optional[dict]:
+        """ The {tmdb_id: state} map of one kind for a user, None instead of creating it """
+        return (self._data["notify_list"].get(str(user_id)) or {}).get(kind)
+
+    def _user_changed(self, user_id: str) -> None:
+        """ Called when an existing user node was changed in place """
+        pass
+
+    def _remove_state(self, user_id: str, kind: str, tmdb_id: str) -> None:
+        states = self._existing_state(user_id, kind)
+        if not states or tmdb_id not in states:
+            return
+        del states[tmdb_id]
+        self._index_remove(kind, tmdb_id, user_id)
+        self._user_changed(user_id)
+
+    # Users and access control
+
+    async def get_user(self, user_id: str) -> Optional[str]:
+        """ Returns the 'gebruiker, first_name' string of a verified user """
+        self._revalidate()
+        return self._data["user_id"].get(str(user_id))
+
+    async def user_ids(self) -> list[str]:
+        """ Returns all verified Telegram user ID's """
+        self._revalidate()
+        return list(self._data["user_id"])
+
+    async def is_blocked(self, user_id: str) -> bool:
+        self._revalidate()
+        return str(user_id) in self._data["blocked_users"]
+
+    async def find_user_by_password(self, password: str) -> Optional[str]:
+        """ Returns the user name the password belongs to """
+        self._revalidate()
+        return self._passwords.lookup(password)
+
+    async def register_user(self, user_id: str, name: str, first_name: str) -> None:
+        """ Marks a Telegram user as verified, subscribed to general updates by default """
+        await self._submit(self._register_user, str(user_id), name, first_name)
+
+    def _register_user(self, user_id: str, name: str, first_name: str) -> None:
+        self._data["user_id"][user_id] = f"{name}, {first_name}"
+        self._unflushed_access["user_id"][user_id] = f"{name}, {first_name}"
+        self._data["update_messages"][user_id] = True
+
+    async def block_user(self, user_id: str, first_name: str) -> None:
+        await self._submit(self._block_user, str(user_id), first_name)
+
+    def _block_user(self, user_id: str, first_name: str) -> None:
+        self._data["blocked_users"][user_id] = first_name
+        self._unflushed_access["blocked_users"][user_id] = first_name
+
+    # General update messages
+
+    async def is_update_subscribed(self, user_id: str) -> bool:
+        """ Default: subscribed unless explicitly turned off """
+        return self._data["update_messages"].get(str(user_id), True) is True
+
+    async def set_update_subscription(self, user_id: str, subscribed: bool) -> bool:
+        """ Sets the general update subscription and returns the previous value """
+        return await self._submit(self._set_update_subscription, str(user_id), subscribed)
+
+    def _set_update_subscription(self, user_id: str, subscribed: bool) -> bool:
+        was_subscribed = self._data["update_messages"].get(user_id, True) is True
+        self._data["update_messages"][user_id] = subscribed
+        return was_subscribed
+
+    # Notify list
+
+    async def notify_list(self) -> dict:
+        """
+        Returns a copy of the notify list:
+        {user_id: {"serie": {}, "film": {}, "recurring_serie": {}, "serie_episode": {}}}
+        """
+        notify = copy.deepcopy(self._data["notify_list"])
+        for node in notify.values():
+            for media_type in NOTIFY_KINDS:
+                node.setdefault(media_type, {})
+        return notify
+
+    async def notify_index(self) -> dict:
+        """
+        Returns a copy of the reverse index:
+        {"serie": {tmdb_id: {user_id: added_at}}, "film": {...}, "recurring_serie": {tmdb_id: {user_id: state}}, "serie_episode": {...}}
+        """
+        return copy.deepcopy(self._index)
+
+    async def media_subscribers(self, tmdb_id: str) -> dict:
+        """ Returns a copy of the reverse index entries of one film/serie: {"serie": {user_id: added_at}, ...} """
+        return {kind: copy.deepcopy(self._index[kind].get(str(tmdb_id), {})) for kind in NOTIFY_KINDS}
+
+    async def add_notify(self, user_id: str, media_type: str, tmdb_id: str, added_at: Optional[int] = None) -> None:
+        """ Adds (or overwrites) a film/serie the user wants to be notified about """
+        added_at = round(time.time()) if added_at is None else added_at
+        await self._submit(self._add_notify, str(user_id), media_type, str(tmdb_id), added_at)
+
+    def _add_notify(self, user_id: str, media_type: str, tmdb_id: str, added_at: int) -> None:
+        self._user_node(user_id)[media_type][tmdb_id] = added_at
+        self._index_set(media_type, tmdb_id, user_id, added_at)
+
+    async def remove_notify(self, user_id: str, media_type: str, tmdb_id: str) -> None:
+        await self._submit(self._remove_notify, str(user_id), media_type, str(tmdb_id))
+
+    def _remove_notify(self, user_id: str, media_type: str, tmdb_id: str) -> None:
+        self._remove_state(user_id, media_type, tmdb_id)
+
+    # Serie episode / recurring season tracking
+
+    async def episode_subscriptions(self, user_id: str) -> dict:
+        """ Returns {tmdb_id: {"started": bool, "last": "SxxExx"}} for one user """
+        node = self._data["notify_list"].get(str(user_id), {})
+        return copy.deepcopy(node.get("serie_episode", {}))
+
+    async def set_episode_state(self, user_id: str, tmdb_id: str, started: bool, last: str) -> None:
+        await self._submit(self._set_episode_state, str(user_id), str(tmdb_id), started, last)
+
+    def _set_episode_state(self, user_id: str, tmdb_id: str, started: bool, last: str) -> None:
+        state = {"started": started, "last": last}
+        self._user_node(user_id)["serie_episode"][tmdb_id] = state
+        self._index_set("serie_episode", tmdb_id, user_id, state)
+
+    async def update_episode_last(self, user_id: str, tmdb_id: str, last: str) -> None:
+        """ Only updates existing entries, an unsubscribe in the meantime is not undone """
+        await self._submit(self._update_episode_last, str(user_id), str(tmdb_id), last)
+
+    def _update_episode_last(self, user_id: str, tmdb_id: str, last: str) -> None:
+        entry = (self._existing_state(user_id, "serie_episode") or {}).get(tmdb_id)
+        if entry is None:
+            return
+        entry["last"] = last
+        self._user_changed(user_id)
+
+    async def remove_episode_state(self, user_id: str, tmdb_id: str) -> None:
+        await self._submit(self._remove_episode_state, str(user_id), str(tmdb_id))
+
+    def _remove_episode_state(self, user_id: str, tmdb_id: str) -> None:
+        self._remove_state(user_id, "serie_episode", tmdb_id)
+
+    async def set_recurring_state(self, user_id: str, tmdb_id: str, last_notified_season: Optional[int] = None, last_seen_season: Optional[int] = None) -> None:
+        """ Creates or updates the recurring season state, None keeps the current value """
+        await self._submit(self._set_recurring_state, str(user_id), str(tmdb_id), last_notified_season, last_seen_season)
+
+    def _set_recurring_state(self, user_id: str, tmdb_id: str, last_notified_season: Optional[int], last_seen_season: Optional[int]) -> None:
+        entry = self._user_node(user_id)["recurring_serie"].setdefault(tmdb_id, {})
+        entry.setdefault("last_notified_season", 0)
+        entry.setdefault("last_seen_season", 0)
+        if last_notified_season is not None:
+            entry["last_notified_season"] = int(last_notified_season)
+        if last_seen_season is not None:
+            entry["last_seen_season"] = int(last_seen_season)
+        self._index_set("recurring_serie", tmdb_id, user_id, entry)
+
+    async def remove_recurring_state(self, user_id: str, tmdb_id: str) -> None:
+        await self._submit(self._remove_recurring_state, str(user_id), str(tmdb_id))
+
+    def _remove_recurring_state(self, user_id: str, tmdb_id: str) -> None:
+        self._remove_state(user_id, "recurring_serie", tmdb_id)
@@ -0,0 +1,164 @@
+#!/usr/bin/python3
+
+import re
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+
+# One mirror per backend (movie/serie) for the whole process, shared by
+# every Radarr/Sonarr instance like the sessions in arr.py.
+_libraries: dict[str, "LibraryMirror"] = {}
+
+
+def normalize_title(title: str) -> str:
+    """ Folds case, punctuation and whitespace: 'The  Office!' and 'the office' give the same key """
+    return " ".join(re.sub(r"[^\w\s]", " ", str(title).casefold()).split())
+
+
+def get_library(label: str) -> "LibraryMirror":
+    """ Returns the process-wide library mirror of a backend """
+
+    if label not in _libraries:
+        _libraries[label] = LibraryMirror(label)
+
+    return _libraries[label]
+
+
+class LibraryMirror:
+    """
+    In-memory copy of the local Radarr/Sonarr library.
+
+    Filled in bulk from /movie or /series by ArrApiHandler.refresh_library
+    (a repeating job) and indexed by tmdbId, tvdbId and normalized title.
+    Media added by queue_download is upserted right away, so the mirror
+    doesn't have to wait for the next refresh. Lookups only trust the
+    mirror while it is fresh; a stale or never filled mirror returns None
+    and callers fall back to the remote lookup.
+
+    For every item the mirror also remembers when it was added or switched
+    to monitored (wall-clock time), so changed_since() can tell which media
+    still need a search after an outage.
+    """
+
+    def __init__(self, label: str):
+
+        # Set default values
+        self.label = label
+        self.max_age: float = 0
+        self.refreshed_at: Optional[float] = None
+        self._by_id: dict[int, dict] = {}
+        self._by_tmdb: dict[str, dict] = {}
+        self._by_tvdb: dict[str, dict] = {}
+        self._by_title: dict[str, dict] = {}
+        self._changed_at: dict[int, float] = {}
+
+    @property
+    def ready(self) -> bool:
+        if self.refreshed_at is None:
+            return False
+        return not self.max_age or time.monotonic() - self.refreshed_at <= self.max_age
+
+    def replace(self, items: list[dict]) -> dict:
+        """ Applies a full library listing, returns the added/changed/removed counts """
+
+        new_by_id = {item["id"]: item for item in items if isinstance(item, dict) and "id" in item}
+        added = len(new_by_id.keys() - self._by_id.keys())
+        removed = len(self._by_id.keys() - new_by_id.keys())
+        changed = sum(1 for media_id, item in new_by_id.items() if media_id in self._by_id and self._by_id[media_id] != item)
+
+        for media_id, item in new_by_id.items():
+            self._track_change(item, self._by_id.get(media_id))
+        for media_id in self._by_id.keys() - new_by_id.keys():
+            self._changed_at.pop(media_id, None)
+
+        self._by_id = new_by_id
+        self._reindex()
+        self.refreshed_at = time.monotonic()
+
+        return {"added": added, "changed": changed, "removed": removed, "total": len(new_by_id)}
+
+    def upsert(self, item: dict) -> None:
+        """ Adds or updates a single item, e.g. the response of queue_download """
+
+        if not isinstance(item, dict) or "id" not in item:
+            return
+
+        previous = self._by_id.get(item["id"])
+        self._track_change(item, previous)
+        if previous is not None:
+            self._unindex(previous)
+        self._by_id[item["id"]] = item
+        self._index(item)
+
+    def _track_change(self, item: dict, previous: Optional[dict]) -> None:
+        """ Records when an item was added (its "added" date) or switched to monitored (now) """
+
+        if previous is None:
+            self._changed_at[item["id"]] = self._timestamp(item.get("added")) or time.time()
+        elif item.get("monitored") and not previous.get("monitored"):
+            self._changed_at[item["id"]] = time.time()
+
+    @staticmethod
+    def _timestamp(value) -> Optional[float]:
+        try:
+            moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+
+    def changed_since(self, since: float) -> Optional[list[int]]:
+        """ Ids of monitored items added or monitored at or after since (time.time()), None without mirror data """
+
+        if self.refreshed_at is None:
+            return None
+
+        return [media_id for media_id, changed_at in self._changed_at.items() if changed_at >= since and self._by_id[media_id].get("monitored")]
+
+    def _reindex(self) -> None:
+        self._by_tmdb, self._by_tvdb, self._by_title = {}, {}, {}
+        for item in self._by_id.values():
+            self._index(item)
+
+    @staticmethod
+    def _keys(item: dict) -> tuple:
+        """ (index, key) pairs of an item, empty keys left out """
+        title = normalize_title(item["title"]) if item.get("title") else None
+        return tuple((name, key) for name, key in (
+            ("_by_tmdb", str(item["tmdbId"]) if item.get("tmdbId") else None),
+            ("_by_tvdb", str(item["tvdbId"]) if item.get("tvdbId") else None),
+            ("_by_title", title),
+        ) if key)
+
+    def _index(self, item: dict) -> None:
+        for name, key in self._keys(item):
+            getattr(self, name)[key] = item
+
+    def _unindex(self, item: dict) -> None:
+        """ Removes the keys of an item, unless they already point to another item """
+        for name, key in self._keys(item):
+            index = getattr(self, name)
+            if index.get(key) is item:
+                del index[key]
+
+    def by_tmdbid(self, tmdbid) -> Optional[dict]:
+        return self._by_tmdb.get(str(tmdbid)) if self.ready else None
+
+    def tmdbid_of(self, media_id) -> Optional[str]:
+        """ tmdbId of a Radarr/Sonarr id, also from a stale mirror """
+        item = self._by_id.get(media_id)
+        return str(item["tmdbId"]) if item and item.get("tmdbId") else None
+
+    def internal_id(self, tmdbid) -> Optional[int]:
+        """ Radarr/Sonarr id of a film/serie, also from a stale mirror: ids don't change once added """
+        item = self._by_tmdb.get(str(tmdbid))
+        return item["id"] if item else None
+
+    def by_tvdbid(self, tvdbid) -> Optional[dict]:
+        return self._by_tvdb.get(str(tvdbid)) if self.ready else None
+
+    def by_title(self, title: str) -> Optional[dict]:
+        """ Library item with exactly this title (case, punctuation and spacing ignored), also from a stale mirror """
+        return self._by_title.get(normalize_title(title))
@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from aiohttp import ClientError
+
+
+# One limiter per backend (movie/serie) for the whole process
+_limiters: dict[str, "AdaptiveLimiter"] = {}
+
+# Call priorities, lower goes first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+def get_limiter(label: str) -> "AdaptiveLimiter":
+    """ Returns the process-wide concurrency limiter of a backend, tuned by ARR_CONCURRENCY_* in dot-env """
+
+    if label not in _limiters:
+        maximum = max(1, int(_env_number("ARR_CONCURRENCY_MAX", _env_number("ARR_POOL_LIMIT", 10))))
+        _limiters[label] = AdaptiveLimiter(
+            label,
+            initial=min(maximum, max(1, int(_env_number("ARR_CONCURRENCY_START", 4)))),
+            maximum=maximum,
+            latency_target=_env_number("ARR_LATENCY_TARGET", 2.0) or 2.0,
+        )
+
+    return _limiters[label]
+
+
+class _Call:
+    """ Outcome of one call through the limiter, set failed for a 5xx answer """
+
+    def __init__(self):
+        self.failed = False
+
+
+class Ticket:
+    """ Priority of a request that can be raised while it waits for a slot, e.g. when a user joins a shared background GET """
+
+    def __init__(self, priority: int = INTERACTIVE):
+        self.priority = priority
+        self._limiter: Optional["AdaptiveLimiter"] = None
+        self._waiter: Optional[asyncio.Future] = None
+
+    def raise_to(self, priority: int) -> None:
+        if priority >= self.priority:
+            return
+        self.priority = priority
+        if self._waiter is not None and not self._waiter.done():
+            self._limiter._requeue(self)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for the requests to one Radarr/Sonarr backend.
+
+    Every answered call within latency_target seconds raises the limit by
+    1/limit (about one slot per round of calls); a 5xx answer, timeout or
+    connection error halves it, at most once per latency_target so one
+    burst of failures doesn't collapse it to 1. The limit stays between 1
+    and maximum (ARR_POOL_LIMIT by default).
+
+    Waiting calls are served interactive first, and background calls
+    (scheduler, jobs) never take the last free slot, so a user lookup only
+    waits for calls that are already running. A background GET that a user
+    request joined is raised to interactive through its Ticket.
+    """
+
+    def __init__(self, label: str, initial: int = 4, maximum: int = 10, latency_target: float = 2.0):
+
+        # Set default values
+        self.label = label
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._last_decrease = 0.0
+
+    def _capacity(self, priority: int) -> int:
+        limit = int(self.limit)
+        return limit if priority == INTERACTIVE or limit <= 1 else limit - 1
+
+    async def acquire(self, priority: int = INTERACTIVE, ticket: Optional[Ticket] = None) -> None:
+
+        # Cancelled (or requeued and granted) waiters are removed lazily, don't queue behind them
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+
+        # Run right away if there is room and no one of the same or higher priority is waiting
+        if not (self._waiters and self._waiters[0][0] <= priority) and self.in_flight < self._capacity(priority):
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        if ticket is not None:
+            ticket._limiter, ticket._waiter = self, waiter
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Granted just before the cancel: hand the slot to the next one
+            if waiter.done() and not waiter.cancelled():
+                self.in_flight -= 1
+                self._wake()
+            raise
+        finally:
+            if ticket is not None:
+                ticket._limiter, ticket._waiter = None, None
+
+    def _requeue(self, ticket: Ticket) -> None:
+        """ Queues a waiting ticket again at its raised priority, the old entry is skipped once granted """
+        heapq.heappush(self._waiters, (ticket.priority, next(self._order), ticket._waiter))
+        self._wake()
+
+    def release(self, latency: float, failed: bool) -> None:
+        self.in_flight -= 1
+
+        now = time.monotonic()
+        if failed:
+            if now - self._last_decrease >= self.latency_target:
+                self.limit = max(1.0, self.limit / 2)
+                self._last_decrease = now
+        elif latency <= self.latency_target:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+        self._wake()
+
+    def _wake(self) -> None:
+        """ Grants free slots to the waiters, highest priority first """
+
+        while self._waiters:
+            priority, _, waiter = self._waiters[0]
+            if waiter.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self._capacity(priority):
+                return
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE, ticket: Optional[Ticket] = None) -> AsyncIterator[_Call]:
+        """
+        Holds one slot for the duration of a request, the caller marks 5xx answers as failed.
+        With a ticket the priority is taken from it and can be raised while waiting.
+        """
+
+        await self.acquire(ticket.priority if ticket is not None else priority, ticket)
+        call = _Call()
+        started = time.monotonic()
+        try:
+            yield call
+        except (ClientError, asyncio.TimeoutError):
+            call.failed = True
+            raise
+        finally:
+            self.release(time.monotonic() - started, call.failed)
+
+    def stats(self) -> dict:
+        return {"limit": round(self.limit, 1), "in_flight": self.in_flight, "waiting": len(self._waiters)}
@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+
+import asyncio
+import contextlib
+import traceback
+from typing import Any, Callable, Optional
+
+
+class MutationQueue:
+    """
+    Single-writer actor for data store mutations.
+
+    Handlers and the scheduler never write state themselves, they submit a
+    small patch operation and await its result. One writer task applies the
+    queued operations in batches against the current state, so a long
+    running job can't overwrite a change a handler made in the meantime and
+    no file locking is needed.
+
+    Subclasses implement the operations as plain sync methods and can wrap
+    a batch with _batch_context() (e.g. one SQLite transaction), each
+    operation with _op_context() (e.g. a savepoint, so a failing operation
+    leaves nothing behind) and react to the batch in _after_batch() (e.g.
+    schedule a flush).
+    """
+
+    def __init__(self, logger):
+
+        # Set default values
+        self.log = logger
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._writer_task: Optional[asyncio.Task] = None
+
+    async def _submit(self, op: Callable, *args) -> Any:
+        """ Queues a patch operation and waits until the writer applied it """
+
+        loop = asyncio.get_running_loop()
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = loop.create_task(self._writer())
+
+        future = loop.create_future()
+        self._queue.put_nowait((op, args, future))
+        return await future
+
+    async def _writer(self) -> None:
+        """ Applies everything that is queued as one batch, then waits for more """
+
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            results = []
+            try:
+                with self._batch_context():
+                    for op, args, _ in batch:
+                        try:
+                            with self._op_context():
+                                results.append((True, op(*args)))
+                        except Exception as e:
+                            results.append((False, e))
+                self._after_batch()
+            except Exception as e:
+                await self.log.logger(f"❌ *Error while applying data store changes.*\nCheck the error log for more information. ❌", False, "error")
+                await self.log.logger(f"Error: {' '.join(map(str, e.args))} - Traceback: {traceback.format_exc()}", False, "error", False)
+                results = [(False, e)] * len(batch)
+
+            # Callers that gave up (cancelled) don't need their result
+            for (ok, value), (_, _, future) in zip(results, batch):
+                if not future.done():
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+                self._queue.task_done()
+
+    async def drain(self) -> None:
+        """ Waits until every queued operation has been applied """
+        if self._writer_task is not None and not self._writer_task.done():
+            await self._queue.join()
+
+    def _batch_context(self):
+        return contextlib.nullcontext()
+
+    def _op_context(self):
+        return contextlib.nullcontext()
+
+    def _after_batch(self) -> None:
+        pass
@@ -0,0 +1,36 @@
+#!/usr/bin/python3
+
+import hashlib
+import os
+from typing import Optional
+
+
+class PasswordIndex:
+    """
+    Maps a salted hash of every password to the user name it belongs to.
+
+    The salt is random per process and the index only lives in memory, so
+    verify_pwd is a single dict lookup and never compares cleartext values.
+    The data store rebuilds it whenever the users table/map changed.
+    """
+
+    def __init__(self):
+
+        # Set default values
+        self._salt = os.urandom(16)
+        self._index: dict[bytes, str] = {}
+
+    def _hash(self, password: str) -> bytes:
+        return hashlib.blake2b(str(password).encode(), key=self._salt, digest_size=32).digest()
+
+    def rebuild(self, users) -> None:
+        """ users: (name, password) pairs, the first name wins for a shared password """
+
+        index = {}
+        for name, password in users:
+            index.setdefault(self._hash(password), str(name))
+        self._index = index
+
+    def lookup(self, password: str) -> Optional[str]:
+        """ Returns the user name the password belongs to """
+        return self._index.get(self._hash(password))
@@ -0,0 +1,248 @@
+#!/usr/bin/python3
+
+import json
+import pickle
+import sqlite3
+from pathlib import Path
+from typing import Any, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput, PicklePersistence
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_data (
+    chat_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bot_data (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS callback_data (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state BLOB NOT NULL,
+    PRIMARY KEY (name, key)
+);
+"""
+
+
+class SqlitePersistence(BasePersistence):
+    """
+    Drop-in replacement for PicklePersistence backed by SQLite.
+
+    PicklePersistence pickles every user_data/chat_data/conversation into one
+    blob on each flush, so one user with a big media_object rewrites the
+    whole file. Here every user, chat and conversation key is its own row:
+    an update only rewrites the rows whose pickled value actually changed.
+
+    user_data and chat_data are loaded on demand: Application.initialize
+    gets empty maps and a row is read the first time an update or job for
+    that user/chat refreshes its data. bot_data, callback_data and the
+    conversation states are small and read at startup.
+
+    The database is opened on the first read; if it doesn't exist yet and
+    the old pickle file does, that file is imported once.
+    """
+
+    def __init__(self, filepath: str, pickle_filepath: Optional[str] = None, store_data: Optional[PersistenceInput] = None, update_interval: float = 60):
+
+        # Set default values
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.filepath = filepath
+        self.pickle_filepath = pickle_filepath
+        self._db: Optional[sqlite3.Connection] = None
+
+        # Last written blob per row, to skip rows that didn't change
+        self._written: dict[tuple, bytes] = {}
+
+        # user_data/chat_data rows that have been handed to the application
+        self._loaded: set[tuple] = set()
+
+    async def _connect(self) -> sqlite3.Connection:
+        """ Opens the database, importing the pickle file if this is the first start """
+
+        if self._db is not None:
+            return self._db
+
+        is_new = not Path(self.filepath).exists()
+        self._db = sqlite3.connect(self.filepath)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+        if is_new and self.pickle_filepath and Path(self.pickle_filepath).is_file():
+            await self._import_pickle()
+
+        return self._db
+
+    async def _import_pickle(self) -> None:
+        """ One-shot import of bot_state.pkl, PTB's own unpickler restores the bot references """
+
+        legacy = PicklePersistence(filepath=self.pickle_filepath)
+        legacy.set_bot(self.bot)
+
+        for user_id, data in (await legacy.get_user_data()).items():
+            self._write_row("user_data", "user_id", user_id, data)
+        for chat_id, data in (await legacy.get_chat_data()).items():
+            self._write_row("chat_data", "chat_id", chat_id, data)
+        self._write_row("bot_data", "id", 0, await legacy.get_bot_data())
+        callback_data = await legacy.get_callback_data()
+        if callback_data is not None:
+            self._write_row("callback_data", "id", 0, callback_data)
+        for name, conversation in (legacy.conversations or {}).items():
+            for key, state in conversation.items():
+                self._write_conversation(name, key, state)
+
+    def _write_row(self, table: str, column: str, key: Any, data: Any) -> None:
+        """ Writes one pickled row, unless it is unchanged since the last write """
+
+        blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        if self._written.get((table, key)) == blob:
+            return
+
+        with self._db:
+            self._db.execute(f"INSERT OR REPLACE INTO {table} ({column}, data) VALUES (?, ?)", (key, blob))
+        self._written[(table, key)] = blob
+
+    def _delete_row(self, table: str, column: str, key: Any) -> None:
+        with self._db:
+            self._db.execute(f"DELETE FROM {table} WHERE {column} = ?", (key,))
+        self._written.pop((table, key), None)
+        self._loaded.discard((table, key))
+
+    def _read_row(self, table: str, column: str, key: Any) -> Optional[Any]:
+        row = self._db.execute(f"SELECT data FROM {table} WHERE {column} = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._written[(table, key)] = row[0]
+        return pickle.loads(row[0])
+
+    def _refresh_row(self, table: str, column: str, key: Any, data: dict) -> None:
+        """ Fills the in-memory dict from its row the first time it is used, values set in memory win """
+
+        if (table, key) in self._loaded:
+            return
+        self._loaded.add((table, key))
+        for name, value in (self._read_row(table, column, key) or {}).items():
+            data.setdefault(name, value)
+
+    def _update_row(self, table: str, column: str, key: Any, data: dict) -> None:
+        """ Writes a user_data/chat_data row, without losing the stored values of a row that was never loaded """
+
+        if (table, key) not in self._loaded:
+            if not data:
+                return
+            data = {**(self._read_row(table, column, key) or {}), **data}
+        self._write_row(table, column, key, data)
+
+    def _read_rows(self, table: str, column: str) -> dict:
+        rows = {}
+        for key, blob in self._db.execute(f"SELECT {column}, data FROM {table}"):
+            rows[key] = pickle.loads(blob)
+            self._written[(table, key)] = blob
+        return rows
+
+    def _write_conversation(self, name: str, key: tuple, state: Optional[object]) -> None:
+        row_key = json.dumps(list(key))
+        if state is None:
+            self._delete_conversation(name, row_key)
+            return
+
+        blob = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        if self._written.get(("conversations", name, row_key)) == blob:
+            return
+
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)", (name, row_key, blob))
+        self._written[("conversations", name, row_key)] = blob
+
+    def _delete_conversation(self, name: str, row_key: str) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM conversations WHERE name = ? AND key = ?", (name, row_key))
+        self._written.pop(("conversations", name, row_key), None)
+
+    # Reads, called once by Application.initialize
+
+    async def get_user_data(self) -> dict[int, dict]:
+        # Loaded per user in refresh_user_data
+        await self._connect()
+        return {}
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        # Loaded per chat in refresh_chat_data
+        await self._connect()
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        await self._connect()
+        return self._read_rows("bot_data", "id").get(0, {})
+
+    async def get_callback_data(self) -> Optional[Any]:
+        await self._connect()
+        return self._read_rows("callback_data", "id").get(0)
+
+    async def get_conversations(self, name: str) -> dict:
+        db = await self._connect()
+        conversations = {}
+        for row_key, blob in db.execute("SELECT key, state FROM conversations WHERE name = ?", (name,)):
+            conversations[tuple(json.loads(row_key))] = pickle.loads(blob)
+            self._written[("conversations", name, row_key)] = blob
+        return conversations
+
+    # Incremental writes
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await self._connect()
+        self._update_row("user_data", "user_id", user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        await self._connect()
+        self._update_row("chat_data", "chat_id", chat_id, data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        await self._connect()
+        self._write_row("bot_data", "id", 0, data)
+
+    async def update_callback_data(self, data: Any) -> None:
+        await self._connect()
+        self._write_row("callback_data", "id", 0, data)
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        await self._connect()
+        self._write_conversation(name, key, new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._connect()
+        self._delete_row("user_data", "user_id", user_id)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._connect()
+        self._delete_row("chat_data", "chat_id", chat_id)
+
+    # Called before every update/job, the data in memory is the newest once it is loaded
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        await self._connect()
+        self._refresh_row("user_data", "user_id", user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        await self._connect()
+        self._refresh_row("chat_data", "chat_id", chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """ Every update is committed right away, only close the database """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -4,22 +4,37 @@ import os
 from typing import Union
 from urllib.parse import quote
 from src.services.arr import ArrApiHandler
+from src.services.library import get_library
+from src.services.limiter import INTERACTIVE
 
 
 class Radarr(ArrApiHandler):
     """ Specific class for the Radarr API """
 
-    def __init__(self, logger):
-        super().__init__(logger, os.getenv('RADARR_API'), os.getenv('RADARR_URL'), "movie")
+    def __init__(self, logger, priority=INTERACTIVE):
+        super().__init__(logger, os.getenv('RADARR_API'), os.getenv('RADARR_URL'), "movie", priority)
 
     async def lookup_by_name(self, movie_name: str) -> Union[list[dict], dict]:
         """ Function that does a movie lookup """
 
+        # Repeat searches (also by other users) are answered from the search cache
+        found, response = self.cached_search(movie_name)
+        if found:
+            return response
+
         # Build url_string and make the request
         response = await self.get(f"/movie/lookup?term={quote(movie_name, safe='')}")
+        self.store_search(movie_name, response)
 
         # Check if return value is empty
         if response is False:
+
+            # Media in the local library is still found by its exact title
+            library_hit = self.library_search(movie_name)
+            if library_hit is not None:
+                await self.log.logger(f"Movie lookup for term {movie_name} failed, answered from the library mirror", False, "warning", False)
+                return library_hit
+
             await self.log.logger(f"❌ *Error while fetching movie list for term {movie_name}.* ❌\nCheck the error log for more information.", False, "error")
             await self.log.logger(f"Response: {response}", False, "error", False)
             return None
@@ -33,6 +48,12 @@ class Radarr(ArrApiHandler):
         # Build url_string and make the request
         response = await self.post(f"/movie?", payload)
 
+        # The lookup now returns the added media (path, id), don't serve the old one
+        # and put the added media in the library mirror right away
+        self.invalidate_lookup(payload.get("tmdbId") or (response or {}).get("tmdbId"))
+        if isinstance(response, dict):
+            get_library(self.label).upsert(response)
+
         # Check if return value is empty
         if response is False:
             await self.log.logger(f"❌ *Error while queueing movie downløad.* ❌\nCheck the error log for more information.", False, "error")
@@ -50,7 +71,7 @@ class Radarr(ArrApiHandler):
                    "filterKey": "monitored", "filterValue": "true"}
 
         # Build url_string and make the request
-        response = await self.post(f"/command?", payload)
+        response = await self.post_command(payload)
 
         # Check if return value is empty
         if response is False:
@@ -60,3 +81,24 @@ class Radarr(ArrApiHandler):
 
         # Return the data
         return response
+
+    async def search_media(self, media_ids: list[int]) -> Union[list[dict], dict]:
+        """ Function that searches only the given movies """
+
+        # Skip ids of media that isn't added yet
+        media_ids = [media_id for media_id in media_ids if media_id]
+        if not media_ids:
+            return None
+
+        # One MoviesSearch command for all movies
+        payload = {"name": "MoviesSearch", "movieIds": media_ids}
+        response = await self.post_command(payload)
+
+        # Check if return value is empty
+        if response is False:
+            await self.log.logger(f"❌ *Error while searching movies {media_ids}.* ❌\nCheck the error log for more information.", False, "warning")
+            await self.log.logger(f"Response: {response}", False, "error", False)
+            return None
+
+        # Return the data
+        return response
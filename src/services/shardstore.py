@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+from src.services.jsonstore import JsonDataStore, ACCESS_KEYS
+
+
+class ShardedDataStore(JsonDataStore):
+    """
+    JSON data store split into one small file per user.
+
+    Layout of the shard folder (data.shards, or data.dev.shards with --env dev):
+        manifest.json         users, user_id and blocked_users (the global maps)
+        users/<user_id>.json  {"user_id": ..., "update_messages": ..., "notify": {...}}
+
+    Reads, the write-behind cache and the mutation queue work exactly like
+    JsonDataStore; a flush only rewrites the shards of users that changed
+    (and the manifest if a global map changed). With Syncthing replicating
+    the folder, a button press re-transfers one small file instead of the
+    whole data.json. On first start an existing data.json is split up once.
+    """
+
+    def __init__(self, logger, shard_dir: str, json_path: str, flush_interval: float = 5.0):
+
+        # Set default values, needed before JsonDataStore loads the files
+        self.shard_dir = shard_dir
+        self.legacy_json_path = json_path
+        self._dirty_shards: set[str] = set()
+        self._manifest_dirty = False
+        self._writing: tuple[set[str], bool] = (set(), False)
+        self._needs_import = not os.path.isdir(shard_dir)
+
+        super().__init__(logger, os.path.join(shard_dir, "manifest.json"), flush_interval)
+
+        # Split data.json into shards the first time
+        if self._needs_import:
+            os.makedirs(os.path.join(shard_dir, "users"), exist_ok=True)
+            self._dirty_shards = set(self._data["notify_list"]) | set(self._data["update_messages"])
+            self._manifest_dirty = True
+            self._write_files(self._payloads())
+            self._signature = self._stat_signature()
+            self._needs_import = False
+            self.log.log_to_file(f"Split {self.legacy_json_path} into {len(self._writing[0])} shards in {self.shard_dir}", "info")
+
+    def _shard_path(self, user_id: str) -> str:
+        safe_id = re.sub(r"[^0-9A-Za-z_-]", "_", str(user_id))
+        return os.path.join(self.shard_dir, "users", f"{safe_id}.json")
+
+    def _read_access(self) -> dict:
+        """ Reads manifest.json and makes sure the global maps exist """
+
+        try:
+            with open(self.json_path, "r") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            data = {}
+
+        for key in ACCESS_KEYS:
+            if not isinstance(data.get(key), dict):
+                data[key] = {}
+
+        return {key: data[key] for key in ACCESS_KEYS}
+
+    def _read_file(self, path: Optional[str] = None) -> dict:
+        """ Reads the manifest plus every user shard into the data.json layout """
+
+        # Nothing sharded yet, start from data.json
+        if self._needs_import:
+            return super()._read_file(self.legacy_json_path)
+
+        data = self._read_access()
+        data["notify_list"] = {}
+        data["update_messages"] = {}
+
+        for shard_path in Path(self.shard_dir, "users").glob("*.json"):
+            with open(shard_path, "r") as file:
+                shard = json.load(file)
+            user_id = str(shard.get("user_id", shard_path.stem))
+            data["notify_list"][user_id] = shard.get("notify", {})
+            if "update_messages" in shard:
+                data["update_messages"][user_id] = shard["update_messages"]
+
+        return data
+
+    def _payloads(self) -> dict[str, str]:
+        """ Serializes the changed shards and, if needed, the manifest """
+
+        payloads = {}
+        for user_id in self._dirty_shards:
+            shard = {"user_id": user_id}
+            if user_id in self._data["update_messages"]:
+                shard["update_messages"] = self._data["update_messages"][user_id]
+            shard["notify"] = self._data["notify_list"].get(user_id, {})
+            payloads[self._shard_path(user_id)] = json.dumps(shard, indent=4)
+
+        # Manifest last, it is the file the access-control signature is taken from
+        if self._manifest_dirty:
+            payloads[self.json_path] = json.dumps({key: self._data[key] for key in ACCESS_KEYS}, indent=4)
+
+        self._writing = (self._dirty_shards, self._manifest_dirty)
+        self._dirty_shards = set()
+        self._manifest_dirty = False
+        return payloads
+
+    def _payloads_failed(self, payloads: dict[str, str]) -> None:
+        shards, manifest = self._writing
+        self._dirty_shards |= shards
+        self._manifest_dirty = self._manifest_dirty or manifest
+
+    # Mutations mark the shard/manifest they touch
+
+    def _user_node(self, user_id: str) -> dict:
+        self._dirty_shards.add(str(user_id))
+        return super()._user_node(user_id)
+
+    def _user_changed(self, user_id: str) -> None:
+        self._dirty_shards.add(str(user_id))
+
+    def _register_user(self, user_id: str, name: str, first_name: str) -> None:
+        super()._register_user(user_id, name, first_name)
+        self._dirty_shards.add(user_id)
+        self._manifest_dirty = True
+
+    def _block_user(self, user_id: str, first_name: str) -> None:
+        super()._block_user(user_id, first_name)
+        self._manifest_dirty = True
+
+    def _set_update_subscription(self, user_id: str, subscribed: bool) -> bool:
+        self._dirty_shards.add(user_id)
+        return super()._set_update_subscription(user_id, subscribed)
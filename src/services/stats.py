@@ -0,0 +1,251 @@
+#!/usr/bin/python3
+
+import asyncio
+import json
+import os
+import time
+import traceback
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import aiofiles
+
+
+# One stats log per file for the whole process, Start is instantiated both by
+# the Bot and by every Media subclass.
+_stats_logs: dict[str, "StatsLog"] = {}
+
+# Event types and the key they map to in the legacy stats.json layout
+EVENT_KEYS = {
+    "login": "logins",
+    "film_request": "film_requests",
+    "serie_request": "serie_requests",
+}
+
+TIME_FORMAT = "%d-%m-%Y %H:%M:%S"
+
+
+def get_stats_log(args, logger) -> "StatsLog":
+    """ Returns the process-wide stats log for the live/dev environment """
+
+    log_path = "stats.jsonl" if args.env == "live" else "stats.dev.jsonl"
+    json_path = "stats.json" if args.env == "live" else "stats.dev.json"
+
+    if log_path not in _stats_logs:
+        _stats_logs[log_path] = StatsLog(logger, log_path, json_path)
+
+    return _stats_logs[log_path]
+
+
+class StatsLog:
+    """
+    Append-only event log for login and media request stats.
+
+    Each event is one JSON line: {"ts": epoch, "event": "login", "user_id": "123", "value": "Name"}.
+    Writing an event appends a single line, so the cost no longer grows with
+    the size of the history. read_nested() rebuilds the old stats.json shape
+    for anything that still needs it.
+
+    compact() rolls events older than STATS_ROLLUP_DAYS into daily per-user
+    counters ({"event": "rollup", "day": "2025-01-31", "logins": 3, ...})
+    and drops everything older than STATS_RETENTION_DAYS.
+    """
+
+    def __init__(self, logger, log_path: str, json_path: str):
+
+        # Set default values
+        self.log = logger
+        self.log_path = log_path
+        self.json_path = json_path
+        self.retention_days = self._env_days("STATS_RETENTION_DAYS", 365)
+
+        # Events can't be kept longer than their rollups
+        self.rollup_days = min(self._env_days("STATS_ROLLUP_DAYS", 30), self.retention_days)
+
+        # Appends wait while compact() rewrites the file
+        self._lock = asyncio.Lock()
+
+        # Convert the legacy stats.json once
+        self._import_json()
+
+    @staticmethod
+    def _env_days(name: str, default: int) -> int:
+        try:
+            return max(1, int(os.getenv(name, str(default))))
+        except ValueError:
+            return default
+
+    def _import_json(self) -> None:
+        """ One-shot conversion of stats.json into the event log """
+
+        if Path(self.log_path).exists() or not Path(self.json_path).is_file():
+            return
+
+        try:
+            with open(self.json_path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            self.log.log_to_file(f"Could not import {self.json_path} into {self.log_path}. Error: {e} - Traceback: {traceback.format_exc()}", "error")
+            return
+
+        events = []
+        for user_id, user_stats in data.items():
+            for event, key in EVENT_KEYS.items():
+                for stamp, value in (user_stats or {}).get(key, {}).items():
+                    try:
+                        ts = round(datetime.strptime(stamp, TIME_FORMAT).timestamp())
+                    except ValueError:
+                        continue
+                    events.append({"ts": ts, "event": event, "user_id": str(user_id), "value": value})
+
+        events.sort(key=lambda e: e["ts"])
+        tmp_path = f"{self.log_path}.import.tmp"
+        with open(tmp_path, "w") as file:
+            for event in events:
+                file.write(json.dumps(event) + "\n")
+        Path(tmp_path).replace(self.log_path)
+
+        self.log.log_to_file(f"Imported {len(events)} events from {self.json_path} into {self.log_path}", "info")
+
+        # The events are in the log now, where compact() applies the retention; don't keep a second copy
+        try:
+            Path(self.json_path).unlink()
+        except OSError as e:
+            self.log.log_to_file(f"Could not remove {self.json_path} after the import, remove it by hand. Error: {e}", "warning")
+
+    async def append(self, event: str, user_id: str, value: str, ts: Optional[int] = None) -> None:
+        """ Appends a single event line """
+
+        line = json.dumps({
+            "ts": round(time.time()) if ts is None else ts,
+            "event": event,
+            "user_id": str(user_id),
+            "value": value,
+        })
+
+        async with self._lock:
+            async with aiofiles.open(self.log_path, "a") as file:
+                await file.write(line + "\n")
+
+    async def log_login(self, user_id: str, first_name: str) -> None:
+        await self.append("login", user_id, first_name)
+
+    async def log_request(self, user_id: str, label: str, title: str) -> None:
+        """ Logs a film/serie request, label is 'film' or 'serie' """
+        await self.append(f"{label}_request", user_id, title)
+
+    async def read_events(self) -> list[dict]:
+        """ Returns all events, skipping lines that can't be parsed (e.g. a torn last line) """
+
+        try:
+            async with aiofiles.open(self.log_path, "r") as file:
+                lines = await file.readlines()
+        except FileNotFoundError:
+            return []
+
+        events = []
+        for line in lines:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+
+        return events
+
+    async def read_nested(self) -> dict:
+        """
+        Aggregates the event log into the legacy stats.json layout:
+        {user_id: {"logins": {time: name}, "film_requests": {time: title}, "serie_requests": {time: title},
+                   "rollups": {"2025-01-31": {"logins": 3, "film_requests": 1, "serie_requests": 0}}}}
+        Days rolled up by compact() only exist as counters, they are under "rollups" instead of the time maps.
+        """
+
+        data = {}
+        for event in await self.read_events():
+            user_stats = data.setdefault(str(event.get("user_id")), {**{k: {} for k in EVENT_KEYS.values()}, "rollups": {}})
+
+            if event.get("event") == "rollup":
+                counters = user_stats["rollups"].setdefault(event.get("day"), {k: 0 for k in EVENT_KEYS.values()})
+                for k in EVENT_KEYS.values():
+                    counters[k] += int(event.get(k, 0) or 0)
+                continue
+
+            key = EVENT_KEYS.get(event.get("event"))
+            if key is None:
+                continue
+            stamp = datetime.fromtimestamp(event.get("ts", 0)).strftime(TIME_FORMAT)
+            user_stats[key][stamp] = event.get("value")
+
+        return data
+
+    async def compact(self, context=None) -> None:
+        """ Rolls old events into daily counters and drops expired data, used as job_queue callback """
+
+        rollup_cutoff = time.time() - self.rollup_days * 86400
+        retention_day = (datetime.now() - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+
+        async with self._lock:
+            try:
+                size_before = os.path.getsize(self.log_path)
+            except FileNotFoundError:
+                return
+
+            try:
+                kept, rollups, rolled = [], {}, 0
+                for event in await self.read_events():
+
+                    # Merge existing rollups so a day that spans two runs ends up in one line
+                    if event.get("event") == "rollup":
+                        key = (event.get("day"), str(event.get("user_id")))
+                        counters = rollups.setdefault(key, {k: 0 for k in EVENT_KEYS.values()})
+                        for k in EVENT_KEYS.values():
+                            counters[k] += int(event.get(k, 0) or 0)
+                        continue
+
+                    counter_key = EVENT_KEYS.get(event.get("event"))
+                    if counter_key is None or event.get("ts", 0) >= rollup_cutoff:
+                        kept.append(event)
+                        continue
+
+                    # Older than the rollup window: only count it
+                    day = datetime.fromtimestamp(event["ts"]).strftime("%Y-%m-%d")
+                    counters = rollups.setdefault((day, str(event.get("user_id"))), {k: 0 for k in EVENT_KEYS.values()})
+                    counters[counter_key] += 1
+                    rolled += 1
+
+                # Drop rollups that fall outside the retention period
+                lines = []
+                dropped = 0
+                for (day, user_id), counters in sorted(rollups.items()):
+                    if day < retention_day:
+                        dropped += 1
+                        continue
+                    ts = round(datetime.strptime(day, "%Y-%m-%d").timestamp())
+                    lines.append(json.dumps({"ts": ts, "event": "rollup", "day": day, "user_id": user_id, **counters}))
+                lines.extend(json.dumps(event) for event in kept)
+
+                await asyncio.to_thread(self._write_file, "".join(line + "\n" for line in lines))
+
+            except Exception as e:
+                await self.log.logger(f"❌ *Error while compacting {self.log_path}.*\nCheck the error log for more information. ❌", False, "error")
+                await self.log.logger(f"Error: {' '.join(map(str, e.args))} - Traceback: {traceback.format_exc()}", False, "error", False)
+                return
+
+            size_after = os.path.getsize(self.log_path)
+
+        await self.log.logger(
+            f"Stats compaction done: {rolled} events rolled up, {dropped} expired days dropped, "
+            f"{size_before - size_after} bytes reclaimed ({size_before} -> {size_after} bytes).",
+            False, "info", False
+        )
+
+    def _write_file(self, payload: str) -> None:
+        """ Replaces the log file atomically """
+
+        tmp_path = f"{self.log_path}.compact.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.log_path)
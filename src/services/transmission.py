@@ -1,14 +1,24 @@
 #!/usr/bin/python3
 
 import os
-import traceback
-from typing import Any, Tuple
+import time
 
 from transmission_rpc import Client
 
+from src.services.library import get_library
+
 # Used to detect down -> up
 _last_transmission_up: bool | None = None
 
+# Wall-clock time (time.time()) of the last check that reached Transmission
+_last_up_at: float | None = None
+
+# Wall-clock time the outage started (the last check that still reached Transmission), None while up
+_down_since: float | None = None
+
+# Seconds between the checks, interval of the check_transmission job
+CHECK_INTERVAL = 1800
+
 
 class TransmissionService:
     """
@@ -36,30 +46,6 @@ class TransmissionService:
         except Exception:
             return False
 
-    async def get_active_torrents(self) -> Tuple[bool, list[Any]]:
-        """
-        Returns: (is_up, torrents)
-        torrents will be [] when Transmission is down.
-        """
-        try:
-            c = self._client()
-            torrents = c.get_torrents(arguments=["name"])
-            return True, torrents
-        except Exception as e:
-            await self.log.logger(
-                f"Transmission is not reachable. Error: {' '.join(map(str, e.args))}",
-                False,
-                "warning",
-                False,
-            )
-            await self.log.logger(
-                f"Transmission connection traceback:\n{traceback.format_exc()}",
-                False,
-                "debug",
-                False,
-            )
-            return False, []
-
 
 async def check_transmission_and_trigger_scans(
     *,
@@ -71,11 +57,13 @@ async def check_transmission_and_trigger_scans(
     Checks Transmission health (in-memory previous state only).
 
     If Transmission recovered (down -> up) and radarr/sonarr are provided,
-    it triggers missing media scans immediately.
+    it searches the media that was added or monitored since Transmission
+    went down. A full missing media scan is only the fallback for a
+    backend without library mirror data.
 
     Returns: True if Transmission is currently reachable, else False.
     """
-    global _last_transmission_up
+    global _last_transmission_up, _last_up_at, _down_since
 
     svc = TransmissionService(logger)
     is_up = await svc.is_available()
@@ -84,18 +72,33 @@ async def check_transmission_and_trigger_scans(
     recovered = prev_up is False and is_up
     _last_transmission_up = is_up
 
+    # The outage may have started right after the last check that reached Transmission.
+    # Without one (down since the bot started) take one check interval as margin.
+    if not is_up and _down_since is None:
+        _down_since = _last_up_at if _last_up_at is not None else time.time() - CHECK_INTERVAL
+    down_since = _down_since
+    if is_up:
+        _down_since = None
+        _last_up_at = time.time()
+
     if recovered:
         await logger.logger(
-            "Transmission recovered (down -> up). Triggering Arr missing-media scans.",
+            "Transmission recovered (down -> up). Searching media added or monitored during the outage.",
             False,
             "info",
             False,
         )
         try:
-            if sonarr is not None:
-                await sonarr.scan_missing_media()
-            if radarr is not None:
-                await radarr.scan_missing_media()
+            for media_handler in (sonarr, radarr):
+                if media_handler is None:
+                    continue
+
+                media_ids = get_library(media_handler.label).changed_since(down_since)
+                if media_ids is None:
+                    await media_handler.scan_missing_media()
+                elif media_ids:
+                    await logger.logger(f"Searching {len(media_ids)} {media_handler.label} item(s) after the Transmission outage", False, "info", False)
+                    await media_handler.search_media(media_ids)
         except Exception as e:
             await logger.logger(
                 f"Failed triggering Arr scans after Transmission recovery. Error: {e}",
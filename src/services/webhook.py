@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+
+import base64
+import binascii
+import hmac
+import os
+from typing import Optional
+
+from aiohttp import web
+from telegram.ext import Application, CallbackContext
+
+from src.services.library import get_library
+
+
+# Radarr/Sonarr event types that mean files were imported (new download or upgrade)
+IMPORT_EVENTS = ("Download",)
+
+
+class WebhookServer:
+    """
+    Receives the Radarr/Sonarr "Connect > Webhook" notifications.
+
+    Configure a webhook in Radarr pointing to http://<host>:<WEBHOOK_PORT>/webhook/radarr
+    and in Sonarr to /webhook/sonarr, with "On Import" and "On Upgrade"
+    enabled. When WEBHOOK_SECRET is set the password field of the webhook
+    (HTTP basic auth) or the X-Webhook-Secret header must match it.
+
+    An import event checks the notify list of that one film/serie right
+    away, so the periodic check_notify_list only has to catch missed events.
+    Without WEBHOOK_PORT the server is disabled.
+    """
+
+    def __init__(self, logger, schedule, application: Application):
+
+        # Set default values
+        self.log = logger
+        self.schedule = schedule
+        self.application = application
+        self.host = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+        self.port = self.configured_port()
+        self.secret = os.getenv("WEBHOOK_SECRET", "")
+        self._runner: Optional[web.AppRunner] = None
+
+    @staticmethod
+    def configured_port() -> Optional[int]:
+        """ The WEBHOOK_PORT from dot-env, None if the webhook is disabled """
+        try:
+            return int(os.getenv("WEBHOOK_PORT", "")) or None
+        except ValueError:
+            return None
+
+    async def start(self) -> None:
+        """ Starts listening, used as post_init hook step """
+
+        if self.port is None or self._runner is not None:
+            return
+
+        app = web.Application(client_max_size=1024 ** 2)
+        app.router.add_post("/webhook/radarr", self.handle_radarr)
+        app.router.add_post("/webhook/sonarr", self.handle_sonarr)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            await self.log.logger(f"❌ *Webhook server could not listen on {self.host}:{self.port}* ❌\nError: {e}", False, "error")
+            await self._runner.cleanup()
+            self._runner = None
+            return
+
+        await self.log.logger(f"Webhook server listening on {self.host}:{self.port}", False, "info", False)
+
+    async def stop(self) -> None:
+        """ Stops listening, used as post_stop hook step """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _authorized(self, request: web.Request) -> bool:
+        if not self.secret:
+            return True
+
+        given = request.headers.get("X-Webhook-Secret", "")
+        authorization = request.headers.get("Authorization", "")
+        if not given and authorization.startswith("Basic "):
+            # Radarr/Sonarr send the username/password of the webhook as basic auth
+            try:
+                given = base64.b64decode(authorization[6:], validate=True).decode().partition(":")[2]
+            except (binascii.Error, UnicodeDecodeError):
+                given = ""
+
+        return hmac.compare_digest(given.encode(), self.secret.encode())
+
+    async def handle_radarr(self, request: web.Request) -> web.Response:
+        return await self._handle(request, "film")
+
+    async def handle_sonarr(self, request: web.Request) -> web.Response:
+        return await self._handle(request, "serie")
+
+    async def _handle(self, request: web.Request, media_type: str) -> web.Response:
+        """ Validates the event and schedules the check of the imported film/serie """
+
+        if not self._authorized(request):
+            await self.log.logger(f"Webhook call with a wrong secret from {request.remote}", False, "warning", False)
+            return web.Response(status=401)
+
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="Invalid JSON")
+        if not isinstance(payload, dict):
+            return web.Response(status=400, text="Invalid JSON")
+
+        event_type = payload.get("eventType")
+        if event_type not in IMPORT_EVENTS:
+            # Test events and grabs/renames/deletes only need an answer
+            return web.Response(text="Ignored")
+
+        tmdb_id = self._tmdb_id(payload, media_type)
+        if not tmdb_id:
+            await self.log.logger(f"Webhook {event_type} event without a tmdbId. Payload: {payload}", False, "warning", False)
+            return web.Response(text="Ignored")
+
+        # The import changed the media, don't serve the old lookup
+        media_handler = self.schedule.radarr if media_type == "film" else self.schedule.sonarr
+        media_handler.invalidate_lookup(tmdb_id)
+
+        # Answer right away, the check runs in the background
+        self.application.create_task(self.schedule.check_media(CallbackContext(self.application), media_type, tmdb_id))
+        await self.log.logger(f"Webhook {event_type} event for {media_type} {tmdb_id}, checking the notify list", False, "info", False)
+        return web.Response(text="OK")
+
+    @staticmethod
+    def _tmdb_id(payload: dict, media_type: str) -> Optional[str]:
+        """ tmdbId of the film/serie in the event, for older Sonarr versions found via the tvdbId """
+
+        if media_type == "film":
+            tmdb_id = (payload.get("movie") or {}).get("tmdbId")
+        else:
+            series = payload.get("series") or {}
+            tmdb_id = series.get("tmdbId")
+            if not tmdb_id and series.get("tvdbId"):
+                tmdb_id = (get_library("serie").by_tvdbid(series["tvdbId"]) or {}).get("tmdbId")
+
+        return str(tmdb_id) if tmdb_id else None
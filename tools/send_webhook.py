@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Sends sample Radarr/Sonarr webhook events to a running bot.
+
+Posts a Test and a Download event for Radarr and for Sonarr to the
+webhook server of the bot (see "Import notifications" in the README),
+once with the WEBHOOK_SECRET as basic auth password and once without it,
+and checks the HTTP status of every answer:
+
+    with the secret       200 (Test answers "Ignored", Download "OK")
+    without the secret    401 if WEBHOOK_SECRET is set, otherwise 200
+
+A Download event makes the bot check the notify list of that film/serie,
+use --test-only to only send the Test events.
+
+WEBHOOK_HOST, WEBHOOK_PORT and WEBHOOK_SECRET are read from the dot-env
+file (--env-file, default dot-env) unless given as arguments.
+
+    python3 tools/send_webhook.py
+    python3 tools/send_webhook.py --port 8787 --secret secret --movie 603 --serie 1399
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+def radarr_payloads(tmdb_id: int) -> dict[str, dict]:
+    movie = {"id": 1, "title": "Test Title", "year": 1970, "tmdbId": tmdb_id, "imdbId": "tt0012345"}
+    return {
+        "Test": {"eventType": "Test", "instanceName": "Radarr", "movie": {"id": 1, "title": "Test Title", "tmdbId": 1234}},
+        "Download": {
+            "eventType": "Download",
+            "instanceName": "Radarr",
+            "movie": movie,
+            "movieFile": {"id": 1, "relativePath": "Test Title (1970).mkv", "quality": "Bluray-1080p"},
+            "isUpgrade": False,
+        },
+    }
+
+
+def sonarr_payloads(tmdb_id: int, tvdb_id: Optional[int]) -> dict[str, dict]:
+    series = {"id": 1, "title": "Test Title", "tmdbId": tmdb_id}
+    if tvdb_id:
+        series["tvdbId"] = tvdb_id
+    return {
+        "Test": {"eventType": "Test", "instanceName": "Sonarr", "series": {"id": 1, "title": "Test Title", "tvdbId": 1234}},
+        "Download": {
+            "eventType": "Download",
+            "instanceName": "Sonarr",
+            "series": series,
+            "episodes": [{"id": 1, "episodeNumber": 1, "seasonNumber": 1, "title": "Test title"}],
+            "episodeFile": {"id": 1, "relativePath": "Season 01/Test Title - S01E01.mkv", "quality": "WEBDL-1080p"},
+            "isUpgrade": False,
+        },
+    }
+
+
+def post(url: str, payload: dict, secret: Optional[str]) -> tuple[int, str]:
+    """ Posts one event, returns the status and body of the answer """
+
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), method="POST")
+    request.add_header("Content-Type", "application/json")
+    if secret is not None:
+        # Radarr/Sonarr send the username/password of the webhook as basic auth
+        request.add_header("Authorization", "Basic " + base64.b64encode(f"bot:{secret}".encode()).decode())
+
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.read().decode(errors="replace")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode(errors="replace")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Send sample Radarr/Sonarr webhook events to the bot")
+    parser.add_argument("--env-file", default="dot-env", help="dot-env file to read WEBHOOK_* from (default dot-env)")
+    parser.add_argument("--host", help="Webhook host (default WEBHOOK_HOST or 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="Webhook port (default WEBHOOK_PORT)")
+    parser.add_argument("--secret", help="Webhook secret (default WEBHOOK_SECRET)")
+    parser.add_argument("--movie", type=int, default=603, help="tmdbId of the film in the Radarr events (default 603)")
+    parser.add_argument("--serie", type=int, default=1399, help="tmdbId of the serie in the Sonarr events (default 1399)")
+    parser.add_argument("--tvdb", type=int, default=121361, help="tvdbId of the serie in the Sonarr events (default 121361)")
+    parser.add_argument("--test-only", action="store_true", help="Only send the Test events")
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path=args.env_file)
+    host = args.host or os.getenv("WEBHOOK_HOST", "127.0.0.1")
+    port = args.port or int(os.getenv("WEBHOOK_PORT") or 0)
+    secret = args.secret if args.secret is not None else os.getenv("WEBHOOK_SECRET", "")
+    if not port:
+        print("WEBHOOK_PORT is not set, the webhook server is disabled. Use --port to give it.", file=sys.stderr)
+        return 2
+
+    events = {
+        "radarr": radarr_payloads(args.movie),
+        "sonarr": sonarr_payloads(args.serie, args.tvdb),
+    }
+
+    failed = 0
+    for backend, payloads in events.items():
+        url = f"http://{host}:{port}/webhook/{backend}"
+        for event_type, payload in payloads.items():
+            if args.test_only and event_type != "Test":
+                continue
+            for with_secret in (True, False):
+                expected = 200 if with_secret or not secret else 401
+                try:
+                    status, body = post(url, payload, secret if with_secret else None)
+                except (urllib.error.URLError, OSError) as e:
+                    print(f"FAIL  {backend:6} {event_type:8} {'with' if with_secret else 'without'} secret: {e}")
+                    failed += 1
+                    continue
+
+                ok = status == expected
+                failed += not ok
+                print(f"{'OK  ' if ok else 'FAIL'}  {backend:6} {event_type:8} {'with' if with_secret else 'without'} secret: {status} {body.strip()!r} (expected {expected})")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())